@@ -0,0 +1,12 @@
+import pytest
+from core.test_runner import temporary_caches
+from django.test.utils import override_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def temporary_cache(tmp_path_factory):
+    """Кэш во временном каталоге: cache.clear() в тестах не трогает
+    BASE_DIR/cache."""
+    directory = tmp_path_factory.mktemp('cache')
+    with override_settings(CACHES=temporary_caches(str(directory))):
+        yield
@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+
+import pytest
+from core.duplicates import DEFAULT_THRESHOLD, detect_duplicate_queries
+
+
+@pytest.fixture
+def assert_no_duplicate_queries():
+    """Контекстный менеджер: тест падает, если внутри блока один и тот же
+    запрос (без учёта параметров) выполнился больше threshold раз."""
+    @contextmanager
+    def check(threshold=DEFAULT_THRESHOLD):
+        with detect_duplicate_queries(threshold) as detector:
+            yield detector
+        if detector.duplicates:
+            pytest.fail(
+                'Найдены повторяющиеся запросы (N+1):\n' + detector.report(),
+                pytrace=False,
+            )
+    return check
@@ -0,0 +1,44 @@
+import pytest
+from django.core.cache import cache
+
+from posts.models import Comment, Follow
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestDuplicateQueries:
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        cache.clear()
+
+    def test_feeds_without_n_plus_one(self, user_client, user, mixer,
+                                      few_posts_with_group,
+                                      assert_no_duplicate_queries):
+        author = few_posts_with_group.author
+        mixer.blend(Follow, user=mixer.blend('auth.User'), author=author)
+        urls = (
+            '/',
+            f'/group/{few_posts_with_group.group.slug}/',
+            f'/profile/{author.username}/',
+            '/follow/',
+        )
+        for url in urls:
+            # Первый показ создаёт миниатюры картинок - по запросам
+            # на картинку, это не N+1. Проверяется повторный показ
+            # с пустым кэшем фрагментов.
+            user_client.get(url)
+            cache.clear()
+            with assert_no_duplicate_queries():
+                response = user_client.get(url)
+            assert response.status_code == 200, url
+
+    def test_post_detail_comments_without_n_plus_one(
+            self, client, mixer, post, assert_no_duplicate_queries):
+        for _ in range(5):
+            Comment.objects.create(
+                post=post, author=mixer.blend('auth.User'), text='Коммент'
+            )
+        with assert_no_duplicate_queries():
+            response = client.get(f'/posts/{post.id}/')
+        assert response.status_code == 200
@@ -0,0 +1,58 @@
+from django import forms
+
+from posts.forms import CommentForm, PostForm
+from posts.models import Group
+
+
+class PreloadedChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField, который ищет выбор в словаре objects
+    {id: объект}, загруженном заранее, а не запросом на значение."""
+    objects = {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        choice = self.objects.get(value) if isinstance(value, int) else None
+        if choice is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice')
+        return choice
+
+
+class BatchPostForm(PostForm):
+    """PostForm для пачки; группы пачки загружены заранее
+    и передаются словарём groups."""
+    group = PreloadedChoiceField(queryset=Group.objects.all(), required=False)
+
+    class Meta(PostForm.Meta):
+        # Группа не поле модели формы: её существование уже проверено,
+        # и full_clean не запрашивает её повторно.
+        fields = ['text', 'image']
+
+    def __init__(self, *args, groups, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['group'].objects = groups
+
+    def clean(self):
+        cleaned_data = super().clean()
+        self.instance.group = cleaned_data.get('group')
+        return cleaned_data
+
+
+class BatchCommentForm(CommentForm):
+    """CommentForm с постом из тела запроса; посты пачки загружены
+    заранее и передаются словарём posts."""
+
+    def __init__(self, *args, posts, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.posts = posts
+
+    def clean(self):
+        cleaned_data = super().clean()
+        post_id = self.data.get('post')
+        post = self.posts.get(post_id) if isinstance(post_id, int) else None
+        if post is None:
+            raise forms.ValidationError(
+                'Пост не найден.', code='invalid_post')
+        self.instance.post = post
+        return cleaned_data
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.paginator import POSTS_PER_PAGE, CursorPaginator
+
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(BasePagination):
+    """Страницы лент по курсорам ?after=/?before= тем же
+    CursorPaginator, что и HTML-ленты: ключ (view.cursor_key, id),
+    размер страницы задаётся ?limit=."""
+    page_size = POSTS_PER_PAGE
+
+    def get_page_size(self, request):
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(limit, 1), MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(
+            queryset,
+            self.get_page_size(request),
+            after=request.query_params.get('after'),
+            before=request.query_params.get('before'),
+            key=getattr(view, 'cursor_key', 'pub_date'),
+        )
+        self.page = paginator.page(1)
+        return list(self.page)
+
+    def _link(self, param, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(remove_query_param(url, 'after'), 'before')
+        return replace_query_param(url, param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict((
+            ('next', self._link('after', self.page.next_cursor)),
+            ('previous', self._link('before', self.page.previous_cursor)),
+            ('results', data),
+        )))
+
+
+class IdCursorPagination(CursorPagination):
+    """Курсор по первичному ключу для списков без даты."""
+    ordering = '-pk'
+    page_size = MAX_PAGE_SIZE
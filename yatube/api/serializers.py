@@ -0,0 +1,52 @@
+from rest_framework import serializers
+
+from posts.models import Comment, Follow, Group, Post
+
+
+class SparseFieldsMixin:
+    """?fields=id,text оставляет в ответе только перечисленные поля."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request and request.query_params.get('fields')
+        if fields:
+            requested = set(fields.split(','))
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class GroupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'title', 'slug', 'description')
+
+
+class PostSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.CharField(source='author.username', read_only=True)
+    group = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Post
+        fields = (
+            'id', 'text', 'pub_date', 'author', 'group', 'image',
+            'comment_count',
+        )
+
+
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    author = serializers.CharField(source='author.username', read_only=True)
+
+    class Meta:
+        model = Comment
+        fields = ('id', 'post', 'author', 'text', 'created')
+
+
+class FollowSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    user = serializers.CharField(source='user.username', read_only=True)
+    author = serializers.CharField(source='author.username', read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ('id', 'user', 'author')
@@ -0,0 +1,24 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from . import views
+
+app_name = 'api'
+
+router = DefaultRouter()
+router.register('posts', views.PostViewSet, basename='posts')
+router.register('groups', views.GroupViewSet, basename='groups')
+router.register(
+    r'posts/(?P<post_id>\d+)/comments', views.CommentViewSet,
+    basename='comments',
+)
+router.register('follow', views.FollowViewSet, basename='follow')
+
+urlpatterns = [
+    # До маршрутов router: иначе posts/batch/ примет маршрут поста.
+    path('v1/posts/batch/', views.PostBatchView.as_view(),
+         name='posts-batch'),
+    path('v1/comments/batch/', views.CommentBatchView.as_view(),
+         name='comments-batch'),
+    path('v1/', include(router.urls)),
+]
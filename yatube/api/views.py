@@ -0,0 +1,228 @@
+from django.contrib.auth import get_user_model
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from rest_framework import permissions, status, viewsets
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from posts.bulk import create_comments, create_posts
+from posts.cache import following_feed, group_feed, index_feed, profile_feed
+from posts.conditional import feed_validators, not_modified, set_validators
+from posts.models import Comment, Group, Post
+
+from .forms import BatchCommentForm, BatchPostForm
+from .pagination import IdCursorPagination, KeysetPagination
+from .serializers import (
+    CommentSerializer, FollowSerializer, GroupSerializer, PostSerializer,
+)
+
+User = get_user_model()
+
+MAX_BATCH_SIZE = 500
+
+
+class ConditionalMixin:
+    """ETag и Last-Modified из версий лент, как у HTML-страниц:
+    ответ 304 отдаётся до запроса строк."""
+
+    def get_feeds(self, instance=None):
+        return ()
+
+    def get_validators(self, instance=None):
+        # JSON и HTML-представление одного адреса различаются.
+        return feed_validators(
+            self.request, *self.get_feeds(instance),
+            variant=self.request.accepted_renderer.format,
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        response = not_modified(request, validators)
+        if response:
+            return response
+        return set_validators(
+            super().list(request, *args, **kwargs), validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.get_validators(instance)
+        response = not_modified(request, validators)
+        if response:
+            return response
+        serializer = self.get_serializer(instance)
+        return set_validators(Response(serializer.data), validators)
+
+
+class PostViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    """Посты; ?group=<slug> и ?author=<username> - ленты группы
+    и автора."""
+    serializer_class = PostSerializer
+    pagination_class = KeysetPagination
+    cursor_key = 'pub_date'
+
+    def _filter(self, param, model, field):
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        if not hasattr(self, f'_{param}'):
+            setattr(self, f'_{param}', get_object_or_404(
+                model.objects.only('pk'), **{field: value}))
+        return getattr(self, f'_{param}')
+
+    def get_queryset(self):
+        queryset = Post.objects.for_feed()
+        group = self._filter('group', Group, 'slug')
+        if group is not None:
+            queryset = queryset.filter(group=group)
+        author = self._filter('author', User, 'username')
+        if author is not None:
+            queryset = queryset.filter(author=author)
+        return queryset
+
+    def get_feeds(self, instance=None):
+        if instance is not None:
+            return (profile_feed(instance.author_id),)
+        group = self._filter('group', Group, 'slug')
+        author = self._filter('author', User, 'username')
+        feeds = []
+        if group is not None:
+            feeds.append(group_feed(group.pk))
+        if author is not None:
+            feeds.append(profile_feed(author.pk))
+        return feeds or [index_feed()]
+
+
+class GroupViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    # Версия групп входит в валидаторы любой ленты.
+    queryset = Group.objects.all()
+    serializer_class = GroupSerializer
+    pagination_class = IdCursorPagination
+    lookup_field = 'slug'
+
+
+class CommentViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    """Комментарии поста от новых к старым."""
+    serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
+    cursor_key = 'created'
+
+    def get_post(self):
+        if not hasattr(self, '_post'):
+            self._post = get_object_or_404(
+                Post.objects.only('author'), pk=self.kwargs['post_id'])
+        return self._post
+
+    def get_queryset(self):
+        return Comment.objects.filter(
+            post=self.get_post()
+        ).select_related('author').order_by('-created', '-pk')
+
+    def get_feeds(self, instance=None):
+        # Комментарии поста сбрасывают ленту профиля его автора.
+        return (profile_feed(self.get_post().author_id),)
+
+
+class FollowViewSet(ConditionalMixin, viewsets.ReadOnlyModelViewSet):
+    """Подписки текущего пользователя."""
+    serializer_class = FollowSerializer
+    pagination_class = IdCursorPagination
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.request.user.follower.select_related('user', 'author')
+
+    def get_feeds(self, instance=None):
+        return (following_feed(self.request.user.pk),)
+
+
+class BatchCreateView(APIView):
+    """Создание пачки записей одним запросом.
+
+    Тело - JSON-список объектов с полями формы form_class. Каждый
+    объект проверяется формой, корректные сохраняются одной
+    транзакцией, в ответе - результат по каждому объекту: id или
+    ошибки формы. Ответ 201, если сохранены все, иначе 207.
+    Сохраняет create_func(автор, объекты) из posts.bulk.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    form_class = None
+    create_func = None
+
+    def prepare(self, items):
+        """Загружает общие для всей пачки данные."""
+
+    def get_form(self, item):
+        return self.form_class(data=item)
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'detail': 'Ожидается непустой список объектов.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response(
+                {'detail': f'Не больше {MAX_BATCH_SIZE} объектов.'},
+                status=status.HTTP_400_BAD_REQUEST)
+        self.prepare(items)
+        results, valid = [], []
+        for index, item in enumerate(items):
+            result = {'index': index, 'id': None}
+            results.append(result)
+            if not isinstance(item, dict):
+                result['errors'] = {'__all__': [
+                    {'message': 'Ожидается объект.', 'code': 'invalid'}]}
+                continue
+            form = self.get_form(item)
+            if form.is_valid():
+                valid.append((result, form.save(commit=False)))
+            else:
+                result['errors'] = form.errors.get_json_data()
+        if valid:
+            self.create_func(
+                request.user, [instance for _, instance in valid])
+            for result, instance in valid:
+                result['id'] = instance.pk
+        return Response(
+            {'created': len(valid), 'results': results},
+            status=(status.HTTP_201_CREATED if len(valid) == len(items)
+                    else status.HTTP_207_MULTI_STATUS),
+        )
+
+
+class PostBatchView(BatchCreateView):
+    """Посты: [{"text": ..., "group": <id группы>}, ...]."""
+    form_class = BatchPostForm
+    create_func = staticmethod(create_posts)
+
+    def prepare(self, items):
+        # Группы всей пачки одним запросом, как посты у комментариев.
+        self.groups = Group.objects.in_bulk({
+            item['group'] for item in items
+            if isinstance(item, dict) and isinstance(item.get('group'), int)
+        })
+
+    def get_form(self, item):
+        return self.form_class(data=item, groups=self.groups)
+
+
+class CommentBatchView(BatchCreateView):
+    """Комментарии: [{"post": <id поста>, "text": ...}, ...]."""
+    form_class = BatchCommentForm
+    create_func = staticmethod(create_comments)
+
+    def prepare(self, items):
+        # Посты всей пачки одним запросом, а не по запросу на объект.
+        self.posts = Post.objects.only('author', 'group').in_bulk({
+            item['post'] for item in items
+            if isinstance(item, dict) and isinstance(item.get('post'), int)
+        })
+
+    def get_form(self, item):
+        return self.form_class(data=item, posts=self.posts)
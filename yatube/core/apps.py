@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import (
+    StaticFilesConfig as BaseStaticFilesConfig,
+)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    """collectstatic пропускает карты исходников и неиспользуемые
+    сборки bootstrap."""
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + [
+        '*.map', 'bootstrap-grid*',
+    ]
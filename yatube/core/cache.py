@@ -0,0 +1,361 @@
+"""Кэш в файле SQLite, общий для всех процессов сервера.
+
+В отличие от LocMemCache, все WSGI-воркеры видят одни и те же
+записи, поэтому сброс версии ленты или очистка кэша действуют сразу
+везде. Файл работает в режиме WAL: чтения не блокируются записью.
+Размер ограничен числом записей (MAX_ENTRIES) и объёмом (MAX_SIZE,
+байт); при превышении сначала удаляются просроченные, затем давно
+не читавшиеся записи (LRU). Счётчики попаданий, промахов и
+вытеснений хранятся в том же файле и доступны команде cache_stats.
+Они копятся в памяти процесса и пишутся в файл раз в
+STATS_FLUSH_INTERVAL секунд, после STATS_FLUSH_PENDING операций и
+при завершении процесса.
+"""
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_accessed
+    ON cache_entries (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO cache_stats (name) VALUES
+    ('hits'), ('misses'), ('evictions'), ('entries'), ('size');
+CREATE TRIGGER IF NOT EXISTS cache_entries_insert
+AFTER INSERT ON cache_entries BEGIN
+    UPDATE cache_stats SET value = value + 1 WHERE name = 'entries';
+    UPDATE cache_stats SET value = value + NEW.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_update
+AFTER UPDATE OF size ON cache_entries BEGIN
+    UPDATE cache_stats SET value = value + NEW.size - OLD.size
+    WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_entries_delete
+AFTER DELETE ON cache_entries BEGIN
+    UPDATE cache_stats SET value = value - 1 WHERE name = 'entries';
+    UPDATE cache_stats SET value = value - OLD.size WHERE name = 'size';
+END;
+'''
+
+UPSERT = '''
+INSERT INTO cache_entries (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+'''
+
+# Время последнего чтения обновляется не чаще раза в секунду:
+# для LRU этого достаточно, а чтения почти не пишут в файл.
+ACCESS_RESOLUTION = 1.0
+STATS_FLUSH_INTERVAL = 5.0
+STATS_FLUSH_PENDING = 100
+
+# Несброшенные счётчики общие для всех экземпляров с одним файлом:
+# Django создаёт свой экземпляр кэша в каждом потоке.
+_pending_stats = {}
+_last_flush = {}
+_stats_lock = threading.Lock()
+
+
+def _encode(value):
+    # Целые храним как INTEGER: счётчики версий не гоняются через pickle.
+    if type(value) is int:
+        return value, 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return sqlite3.Binary(data), len(data)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+def _take_pending(path, force=False):
+    """Забирает накопленные счётчики файла, если их пора записать."""
+    with _stats_lock:
+        pending = _pending_stats.get(path)
+        if not pending:
+            return None
+        if not force and (
+            sum(pending.values()) < STATS_FLUSH_PENDING
+            and time.monotonic() - _last_flush[path] < STATS_FLUSH_INTERVAL
+        ):
+            return None
+        _last_flush[path] = time.monotonic()
+        return _pending_stats.pop(path)
+
+
+def _write_stats(conn, pending):
+    conn.executemany(
+        'UPDATE cache_stats SET value = value + ? WHERE name = ?',
+        [(value, name) for name, value in pending.items()]
+    )
+
+
+def _flush_at_exit():
+    with _stats_lock:
+        paths = list(_pending_stats)
+    for path in paths:
+        pending = _take_pending(path, force=True)
+        # Удалённый файл (временный кэш тестов) не создаём заново.
+        if not pending or not os.path.exists(path):
+            continue
+        try:
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            try:
+                _write_stats(conn, pending)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # При выходе сообщить об ошибке уже некому.
+            pass
+
+
+def _forget_pending():
+    # Дочерний процесс не пишет счётчики, накопленные родителем,
+    # иначе после fork они попадут в файл по разу от каждого воркера.
+    global _stats_lock
+    _stats_lock = threading.Lock()
+    _pending_stats.clear()
+    _last_flush.clear()
+
+
+atexit.register(_flush_at_exit)
+os.register_at_fork(after_in_child=_forget_pending)
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # После fork соединение родителя использовать нельзя.
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.executescript(SCHEMA)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, amount=1):
+        if not amount:
+            return
+        with _stats_lock:
+            _pending_stats.setdefault(self._path, Counter())[name] += amount
+            _last_flush.setdefault(self._path, time.monotonic())
+
+    def _flush_stats(self, force=False):
+        pending = _take_pending(self._path, force)
+        if pending:
+            _write_stats(self._connection(), pending)
+
+    @staticmethod
+    def _totals(conn):
+        return conn.execute(
+            "SELECT (SELECT value FROM cache_stats WHERE name = 'entries'), "
+            "(SELECT value FROM cache_stats WHERE name = 'size')"
+        ).fetchone()
+
+    def _over_limit(self, conn):
+        entries, size = self._totals(conn)
+        if entries > self._max_entries or size > self._max_size:
+            return entries
+        return 0
+
+    def _cull(self, conn, now):
+        if not self._over_limit(conn):
+            return
+        evicted = conn.execute(
+            'DELETE FROM cache_entries WHERE expires <= ?', (now,)
+        ).rowcount
+        entries = self._over_limit(conn)
+        while entries:
+            evicted += conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY accessed LIMIT ?)',
+                (max(1, entries // self._cull_frequency),)
+            ).rowcount
+            entries = self._over_limit(conn)
+        self._count('evictions', evicted)
+
+    def _write(self, key, value, timeout, only_new=False):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        data, size = _encode(value)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if only_new:
+                row = conn.execute(
+                    'SELECT expires FROM cache_entries WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and (row[0] is None or row[0] > now):
+                    conn.execute('COMMIT')
+                    return False
+            conn.execute(UPSERT, (key, data, expires, now, size))
+            self._cull(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._write(key, value, timeout, only_new=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout)
+
+    def _get_rows(self, keys):
+        now = time.time()
+        conn = self._connection()
+        placeholders = ', '.join('?' * len(keys))
+        rows = conn.execute(
+            f'SELECT key, value, expires, accessed FROM cache_entries '
+            f'WHERE key IN ({placeholders})', keys
+        ).fetchall()
+        found, touched = {}, []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            found[key] = _decode(value)
+            if now - accessed > ACCESS_RESOLUTION:
+                touched.append((now, key))
+        if touched:
+            conn.executemany(
+                'UPDATE cache_entries SET accessed = ? WHERE key = ?', touched
+            )
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        self._flush_stats()
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._get_rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            key_map[cache_key] = key
+        if not key_map:
+            return {}
+        found = self._get_rows(list(key_map))
+        return {key_map[key]: value for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись в одной
+        транзакции BEGIN IMMEDIATE."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value, expires FROM cache_entries WHERE key = ?',
+                (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                raise ValueError("Key '%s' not found" % key)
+            value = _decode(row[0]) + delta
+            data, size = _encode(value)
+            conn.execute(
+                'UPDATE cache_entries SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?', (data, size, now, key)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection().execute(
+            'DELETE FROM cache_entries WHERE key = ?', (key,)
+        )
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self._connection().executemany(
+            'DELETE FROM cache_entries WHERE key = ?',
+            [(key,) for key in keys]
+        )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        self._flush_stats()
+
+    def stats(self):
+        """Счётчики кэша всех процессов."""
+        self._flush_stats(force=True)
+        return dict(self._connection().execute(
+            'SELECT name, value FROM cache_stats'
+        ))
+
+    def reset_stats(self):
+        self._connection().execute(
+            "UPDATE cache_stats SET value = 0 "
+            "WHERE name IN ('hits', 'misses', 'evictions')"
+        )
@@ -0,0 +1,104 @@
+"""Сжатие ответов gzip и brotli.
+
+Потоковые ответы сжимаются по частям: после каждой части поток
+сбрасывается (sync flush), и клиент получает начало страницы, не
+дожидаясь конца. brotli используется, если установлен модуль brotli.
+
+BREACH: длина сжатого ответа с секретом (CSRF-токеном) и текстом
+из запроса выдаёт совпадения секрета с этим текстом. Django
+маскирует токен заново на каждый ответ, а здесь к этому добавлено
+случайное имя файла в заголовке gzip (Heal The Breach): длина
+ответа меняется от запроса к запросу. У brotli такого поля нет,
+поэтому страницы с токеном сжимаются только gzip.
+"""
+import gzip
+import io
+import secrets
+import string
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_RANDOM_BYTES = 100
+
+
+def accepted_encodings(header):
+    return {
+        value.split(';')[0].strip().lower() for value in header.split(',')
+    }
+
+
+def choose_encoding(request, allow_brotli=True):
+    accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if allow_brotli and brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class GzipEncoder:
+    def __init__(self, max_random_bytes=0):
+        self.buffer = io.BytesIO()
+        filename = ''
+        if max_random_bytes:
+            filename = ''.join(
+                secrets.choice(string.ascii_letters)
+                for _ in range(secrets.randbelow(max_random_bytes) + 1)
+            )
+        self.file = gzip.GzipFile(
+            filename=filename, mode='wb', compresslevel=GZIP_LEVEL,
+            fileobj=self.buffer, mtime=0,
+        )
+
+    def _read(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def compress(self, data, flush=False):
+        self.file.write(data)
+        if flush:
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+        return self._read()
+
+    def finish(self):
+        self.file.close()
+        return self._read()
+
+
+class BrotliEncoder:
+    def __init__(self, max_random_bytes=0):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data, flush=False):
+        compressed = self.compressor.process(data)
+        if flush:
+            compressed += self.compressor.flush()
+        return compressed
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+ENCODERS = {'gzip': GzipEncoder, 'br': BrotliEncoder}
+
+
+def compress_string(data, encoding, max_random_bytes=0):
+    encoder = ENCODERS[encoding](max_random_bytes)
+    return encoder.compress(data) + encoder.finish()
+
+
+def compress_sequence(chunks, encoding, max_random_bytes=0):
+    encoder = ENCODERS[encoding](max_random_bytes)
+    for chunk in chunks:
+        data = encoder.compress(chunk, flush=True)
+        if data:
+            yield data
+    yield encoder.finish()
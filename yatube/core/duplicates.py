@@ -0,0 +1,67 @@
+"""Поиск повторяющихся SQL-запросов (N+1).
+
+Запросы сравниваются по отпечатку: SQL без параметров и литералов,
+со свёрнутыми списками IN (...). Если один отпечаток выполнился
+больше порога за запрос или тест, это почти всегда цикл по объектам
+со связанным полем без select_related/prefetch_related.
+"""
+import re
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+DEFAULT_THRESHOLD = 3
+REPORT_SQL_LENGTH = 300
+
+WHITESPACE_RE = re.compile(r'\s+')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+
+
+class DuplicateQueryWarning(UserWarning):
+    pass
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковый для запросов одной формы."""
+    sql = STRING_RE.sub('?', sql.replace('%s', '?'))
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_LIST_RE.sub('(...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class DuplicateQueryDetector:
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper."""
+        self.counts[fingerprint(sql)] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def duplicates(self):
+        """Отпечатки, выполненные больше порога, по убыванию числа."""
+        return [
+            (sql, count) for sql, count in self.counts.most_common()
+            if count > self.threshold
+        ]
+
+    def report(self):
+        return '\n'.join(
+            f'{count} раз: {sql[:REPORT_SQL_LENGTH]}'
+            for sql, count in self.duplicates
+        )
+
+
+@contextmanager
+def detect_duplicate_queries(threshold=DEFAULT_THRESHOLD):
+    """Считает отпечатки запросов ко всем базам внутри блока."""
+    detector = DuplicateQueryDetector(threshold)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
@@ -0,0 +1,107 @@
+"""Очередь писем.
+
+QueuedEmailBackend не ходит в почтовый сервер, а сохраняет письмо
+в таблицу OutboxMessage в той же транзакции, что и запрос: ответ
+не ждёт SMTP, а письмо не теряется при падении процесса. Команда
+send_queued_mail разбирает очередь пачками через один открытый
+на пачку OUTBOX_EMAIL_BACKEND. Неудачная отправка повторяется
+с экспоненциальной задержкой, после MAX_ATTEMPTS попыток
+письмо остаётся в таблице с текстом последней ошибки.
+"""
+import pickle
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+# Задержка повтора: RETRY_DELAY * 2 ** (попытка - 1), не больше MAX.
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=6)
+# Взятое в работу письмо другие воркеры не трогают до конца аренды.
+LEASE = timedelta(minutes=10)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        now = timezone.now()
+        queued = []
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            # Ошибки заголовков (BadHeaderError) видны сразу в запросе.
+            message.message()
+            message.connection = None
+            queued.append(OutboxMessage(
+                message=pickle.dumps(message, pickle.HIGHEST_PROTOCOL),
+                next_attempt=now,
+            ))
+        OutboxMessage.objects.bulk_create(queued)
+        return len(queued)
+
+
+def retry_delay(attempts):
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def _claim(batch_size, now):
+    """Берёт в работу до batch_size писем, готовых к отправке."""
+    candidates = OutboxMessage.objects.filter(
+        next_attempt__lte=now,
+        attempts__lt=MAX_ATTEMPTS,
+    ).order_by('next_attempt').values_list('pk', 'next_attempt')
+    claimed = []
+    for pk, next_attempt in candidates[:batch_size]:
+        # Письмо могли забрать параллельно: условие на старое время.
+        if OutboxMessage.objects.filter(
+            pk=pk, next_attempt=next_attempt
+        ).update(next_attempt=now + LEASE):
+            claimed.append(pk)
+    return OutboxMessage.objects.filter(pk__in=claimed).order_by('pk')
+
+
+def _postpone(item, now, error):
+    OutboxMessage.objects.filter(pk=item.pk).update(
+        attempts=F('attempts') + 1,
+        next_attempt=now + retry_delay(item.attempts + 1),
+        last_error=repr(error),
+    )
+
+
+def send_queued(batch_size=BATCH_SIZE):
+    """Отправляет одну пачку; возвращает (отправлено, ошибок)."""
+    now = timezone.now()
+    batch = list(_claim(batch_size, now))
+    if not batch:
+        return 0, 0
+    try:
+        connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+        connection.open()
+    except Exception as error:
+        # Сервер недоступен: попытка засчитывается всей пачке,
+        # иначе письма висели бы до конца аренды.
+        for item in batch:
+            _postpone(item, now, error)
+        return 0, len(batch)
+    sent, failed = [], 0
+    try:
+        for item in batch:
+            try:
+                message = pickle.loads(item.message)
+                message.connection = connection
+                message.send()
+            except Exception as error:
+                failed += 1
+                _postpone(item, now, error)
+            else:
+                sent.append(item.pk)
+    finally:
+        connection.close()
+        OutboxMessage.objects.filter(pk__in=sent).delete()
+    return len(sent), failed
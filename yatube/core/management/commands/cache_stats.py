@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания, промахи и вытеснения кэшей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.'
+        )
+
+    def handle(self, *args, **options):
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if not hasattr(cache, 'stats'):
+                self.stdout.write(f'{alias}: счётчики не поддерживаются')
+                continue
+            stats = cache.stats()
+            requests = stats['hits'] + stats['misses']
+            ratio = stats['hits'] / requests if requests else 0
+            self.stdout.write(
+                f"{alias}: попаданий {stats['hits']}, "
+                f"промахов {stats['misses']} ({ratio:.1%} попаданий), "
+                f"вытеснений {stats['evictions']}, "
+                f"записей {stats['entries']}, "
+                f"объём {stats['size']} байт"
+            )
+            if options['reset']:
+                cache.reset_stats()
@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import BATCH_SIZE, send_queued
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Писем за одно соединение с почтовым сервером.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новые письма.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Пауза между проверками пустой очереди, с.'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = send_queued(options['batch_size'])
+            except Exception:
+                # В режиме --loop сбой (например, базы) не роняет воркер.
+                if not options['loop']:
+                    raise
+                logger.exception('Не удалось разобрать очередь писем')
+                time.sleep(options['interval'])
+                continue
+            if sent or failed:
+                self.stdout.write(
+                    f'Отправлено: {sent}, ошибок: {failed}')
+            elif not options['loop']:
+                return
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Компилирует шаблоны и прогревает кэши перед приёмом трафика.'
+
+    def handle(self, *args, **options):
+        errors = warm_up(log=self.stdout.write)
+        if errors:
+            raise CommandError(f'Ошибок в шаблонах: {len(errors)}')
@@ -0,0 +1,120 @@
+"""Замеры запросов: SQL, время шаблонов, размер ответа.
+
+Замеры текущего запроса копятся в RequestMetrics (thread-local),
+итоги складываются в скользящее окно по имени URL. Окно живёт
+в памяти процесса: у каждого воркера своя статистика.
+"""
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+ROLLING_WINDOW = 1000
+# Верхние границы корзин гистограммы длительности, мс.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, math.inf)
+UNRESOLVED_VIEW = '<unresolved>'
+
+_local = threading.local()
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=ROLLING_WINDOW))
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper: считает запросы."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def template_started(self):
+        self._template_depth += 1
+        return time.perf_counter()
+
+    def template_finished(self, started):
+        # render_to_string внутри шаблона не учитывается дважды.
+        self._template_depth -= 1
+        if not self._template_depth:
+            self.template_time += time.perf_counter() - started
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def active(metrics):
+    """Делает metrics текущими замерами потока внутри блока.
+
+    Потоковый ответ входит в блок на каждую свою часть: между частями
+    поток может обслуживать другой код.
+    """
+    previous, _local.metrics = current(), metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def record(view_name, metrics, size):
+    sample = (
+        metrics.total_time * 1000, metrics.queries,
+        metrics.db_time * 1000, metrics.template_time * 1000, size,
+    )
+    with _lock:
+        _samples[view_name].append(sample)
+
+
+def _percentile(ordered, percent):
+    return ordered[max(1, math.ceil(percent / 100 * len(ordered))) - 1]
+
+
+def summary():
+    """Сводка по окну для каждого имени URL."""
+    with _lock:
+        samples = {name: list(items) for name, items in _samples.items()}
+    result = {}
+    for name, items in sorted(samples.items()):
+        durations = sorted(item[0] for item in items)
+        count = len(items)
+        histogram, lower = {}, 0
+        for bound in LATENCY_BUCKETS:
+            label = f'<={bound}' if bound != math.inf else f'>{lower}'
+            histogram[label] = sum(
+                1 for duration in durations if lower < duration <= bound
+            )
+            lower = bound
+        result[name] = {
+            'requests': count,
+            'p50_ms': round(_percentile(durations, 50), 2),
+            'p95_ms': round(_percentile(durations, 95), 2),
+            'p99_ms': round(_percentile(durations, 99), 2),
+            'queries_avg': round(sum(item[1] for item in items) / count, 2),
+            'queries_max': max(item[1] for item in items),
+            'db_ms_avg': round(sum(item[2] for item in items) / count, 2),
+            'template_ms_avg': round(
+                sum(item[3] for item in items) / count, 2),
+            'size_avg': round(sum(
+                item[4] or 0 for item in items) / count),
+            'histogram_ms': histogram,
+        }
+    return result
+
+
+def reset():
+    with _lock:
+        _samples.clear()
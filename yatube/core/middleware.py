@@ -0,0 +1,279 @@
+import cProfile
+import json
+import mimetypes
+import os
+import re
+import time
+import warnings
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+from . import compression, metrics, profiling
+from .duplicates import DuplicateQueryDetector, DuplicateQueryWarning
+from .streaming import MeasuredStream
+
+
+class RequestMetricsMiddleware:
+    """Замеряет запрос: число и время SQL, время шаблонов, размер ответа.
+
+    Итоги уходят в заголовок Server-Timing и в скользящее окно
+    core.metrics по имени URL (например, posts:index). Стоит первым
+    после StaticAssetsMiddleware, чтобы учитывать запросы сессии
+    и пользователя.
+
+    У потокового ответа замеры продолжаются, пока отдаются его части,
+    и попадают только в окно: заголовки к тому времени уже отправлены.
+
+    Если задан DUPLICATE_QUERY_THRESHOLD, запросы, повторившиеся
+    больше порога, выдаются как DuplicateQueryWarning.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(
+            settings, 'DUPLICATE_QUERY_THRESHOLD', None
+        )
+
+    @contextmanager
+    def measure(self, request_metrics, detector):
+        with ExitStack() as stack:
+            stack.enter_context(metrics.active(request_metrics))
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request_metrics)
+                )
+                if detector is not None:
+                    stack.enter_context(connection.execute_wrapper(detector))
+            yield
+
+    def finish(self, request, request_metrics, detector, size):
+        match = request.resolver_match
+        view_name = match.view_name if match else metrics.UNRESOLVED_VIEW
+        if detector is not None and detector.duplicates:
+            warnings.warn(DuplicateQueryWarning(
+                f'{view_name}: повторяющиеся запросы\n{detector.report()}'
+            ))
+        metrics.record(view_name, request_metrics, size)
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        detector = None
+        if self.duplicate_threshold is not None:
+            detector = DuplicateQueryDetector(self.duplicate_threshold)
+        with self.measure(request_metrics, detector):
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                partial(self.measure, request_metrics, detector),
+                partial(self.finish, request, request_metrics, detector),
+            )
+            return response
+        self.finish(request, request_metrics, detector, len(response.content))
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={request_metrics.db_time * 1000:.1f};'
+            f'desc="SQL x{request_metrics.queries}"',
+            f'tpl;dur={request_metrics.template_time * 1000:.1f}',
+            f'total;dur={request_metrics.total_time * 1000:.1f}',
+        ))
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует медленные запросы и запросы персонала с заголовком.
+
+    Запросы дольше PROFILE_SLOW_REQUEST_MS сохраняются как collapsed-
+    стеки сэмплера. Запрос сотрудника с заголовком PROFILE_HEADER
+    профилируется ещё и cProfile (.prof). Файлы пишутся в PROFILE_DIR
+    с именем URL в названии. Стоит после AuthenticationMiddleware.
+    Потоковый ответ профилируется до конца отдачи, заголовок X-Profile
+    у него не ставится.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request = getattr(
+            settings, 'PROFILE_SLOW_REQUEST_MS', None
+        )
+        self.header = getattr(settings, 'PROFILE_HEADER', None)
+        if self.slow_request is None and self.header is None:
+            raise MiddlewareNotUsed
+        self.directory = settings.PROFILE_DIR
+        self.interval = settings.PROFILE_SAMPLE_INTERVAL
+
+    @contextmanager
+    def profile(self, profiler, stacks):
+        profiling.start_sampling(self.interval, stacks)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            profiling.stop_sampling()
+
+    def finish(self, request, profiler, stacks, started, size=None):
+        """Сохраняет профиль; возвращает имя файла или None."""
+        duration = time.perf_counter() - started
+        slow = (self.slow_request is not None
+                and duration * 1000 >= self.slow_request)
+        if not (profiler is not None or slow):
+            return None
+        match = request.resolver_match
+        view_name = match.view_name if match else metrics.UNRESOLVED_VIEW
+        path = profiling.profile_path(
+            self.directory, view_name, duration, 'collapsed'
+        )
+        profiling.write_collapsed(path, stacks)
+        if profiler is not None:
+            profiler.dump_stats(path[:-len('collapsed')] + 'prof')
+        return path
+
+    def __call__(self, request):
+        requested = (
+            self.header is not None
+            and self.header in request.META
+            and request.user.is_staff
+        )
+        if not requested and self.slow_request is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile() if requested else None
+        stacks = Counter()
+        started = time.perf_counter()
+        with self.profile(profiler, stacks):
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = MeasuredStream(
+                response.streaming_content,
+                partial(self.profile, profiler, stacks),
+                partial(self.finish, request, profiler, stacks, started),
+            )
+            return response
+        path = self.finish(request, profiler, stacks, started)
+        if path is not None and profiler is not None:
+            response['X-Profile'] = os.path.basename(path)
+        return response
+
+
+class StaticAssetsMiddleware:
+    """Отдаёт собранную collectstatic статику из STATIC_ROOT.
+
+    Файлы с хешем в имени (из манифеста ManifestStaticFilesStorage)
+    не меняются, поэтому кэшируются браузером навсегда (immutable).
+    Если клиент принимает br или gzip, отдаётся готовая сжатая копия.
+    Работает при DEBUG = False и собранной статике; стоит первым
+    в MIDDLEWARE, чтобы не тратить на статику сессии и замеры.
+    """
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+    # Файлы без хеша могут смениться при следующем деплое.
+    MUTABLE = 'public, max-age=300'
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        root = settings.STATIC_ROOT
+        manifest = root and os.path.join(root, 'staticfiles.json')
+        if settings.DEBUG or not manifest or not os.path.exists(manifest):
+            raise MiddlewareNotUsed
+        with open(manifest, encoding='utf-8') as file:
+            self.hashed = set(json.load(file)['paths'].values())
+        self.prefix = settings.STATIC_URL
+        self.files = {}
+        for directory, _, names in os.walk(root):
+            for file_name in names:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                self.files[name] = path
+
+    def _encoding(self, request, name):
+        accepted = re.split(
+            r'\s*,\s*', request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        accepted = {value.split(';')[0] for value in accepted}
+        for encoding, extension in self.ENCODINGS:
+            if encoding in accepted and name + extension in self.files:
+                return encoding, name + extension
+        return None, name
+
+    def __call__(self, request):
+        if (request.method not in ('GET', 'HEAD')
+                or not request.path_info.startswith(self.prefix)):
+            return self.get_response(request)
+        name = request.path_info[len(self.prefix):]
+        if name not in self.files:
+            return self.get_response(request)
+        encoding, served = self._encoding(request, name)
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(
+            open(self.files[served], 'rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Cache-Control'] = (
+            self.IMMUTABLE if name in self.hashed else self.MUTABLE
+        )
+        return response
+
+
+class CompressionMiddleware:
+    """Сжимает HTML, JSON и другие текстовые ответы (core.compression).
+
+    Пропускает ответы короче MIN_SIZE, уже сжатые (с Content-Encoding)
+    и медиа с несжимаемыми типами. Страницы с CSRF-токеном сжимаются
+    gzip со случайной добавкой длины. Стоит после
+    RequestMetricsMiddleware: в замеры попадает размер сжатого ответа.
+    """
+    MIN_SIZE = 512
+    COMPRESSIBLE_TYPES = (
+        'text/', 'application/json', 'application/javascript',
+        'application/xml', 'image/svg+xml',
+    )
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '')
+        if (response.has_header('Content-Encoding')
+                or not content_type.startswith(self.COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < self.MIN_SIZE:
+            return response
+
+        has_token = request.META.get('CSRF_COOKIE_USED', False)
+        encoding = compression.choose_encoding(
+            request, allow_brotli=not has_token)
+        if encoding is None:
+            return response
+        padding = compression.MAX_RANDOM_BYTES if has_token else 0
+        if response.streaming:
+            response.streaming_content = compression.compress_sequence(
+                response.streaming_content, encoding, padding)
+            del response['Content-Length']
+        else:
+            compressed = compression.compress_string(
+                response.content, encoding, padding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        # Сжатое представление не совпадает побайтно с несжатым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
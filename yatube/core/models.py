@@ -10,3 +10,15 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class OutboxMessage(CreatedModel):
+    """Письмо в очереди на отправку (см. core.mail)."""
+    message = models.BinaryField('Письмо')
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    next_attempt = models.DateTimeField('Следующая попытка', db_index=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Очередь писем'
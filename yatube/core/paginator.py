@@ -0,0 +1,168 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+def encode_cursor(obj, key='pub_date'):
+    """Кодирует позицию записи в ленте (key, id) в строку для URL."""
+    raw = f'{getattr(obj, key).isoformat()}|{obj.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор из URL. Для испорченного курсора возвращает None."""
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def keyset(queryset, after=None, before=None, key='pub_date', pk='pk',
+           descending=True):
+    """Записи после курсора after (в порядке ленты) или до курсора
+    before (в обратном порядке). Курсоры - разобранные пары (key, pk);
+    pk - поле, которое разрешает равенство key. Лента идёт от новых
+    к старым, с descending=False - от старых к новым."""
+    older, newer = 'lt', 'gt'
+    forward, backward = '-', ''
+    if not descending:
+        older, newer = newer, older
+        forward, backward = backward, forward
+    if after:
+        value, number = after
+        return queryset.filter(
+            Q(**{f'{key}__{older}': value})
+            | Q(**{key: value, f'{pk}__{older}': number})
+        ).order_by(f'{forward}{key}', f'{forward}{pk}')
+    if before:
+        value, number = before
+        return queryset.filter(
+            Q(**{f'{key}__{newer}': value})
+            | Q(**{key: value, f'{pk}__{newer}': number})
+        ).order_by(f'{backward}{key}', f'{backward}{pk}')
+    return queryset.order_by(f'{forward}{key}', f'{forward}{pk}')
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор ленты по ключу (key, id), по умолчанию
+    (pub_date, id); записи идут от новых к старым, с descending=False -
+    от старых к новым.
+
+    Вместо OFFSET/LIMIT и COUNT(*) выбирает per_page + 1 записей
+    после (after) или до (before) курсора, поэтому глубокие страницы
+    стоят столько же, сколько первая. С exact=True работает как
+    обычный Paginator с номерами страниц - для небольших выборок.
+    """
+
+    def __init__(self, object_list, per_page, after=None, before=None,
+                 exact=False, key='pub_date', descending=True, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.key = key
+        self.descending = descending
+        self.after = decode_cursor(after)
+        self.before = None if self.after else decode_cursor(before)
+        self.exact = exact
+        self._has_more = None
+
+    @property
+    def num_pages(self):
+        if self.exact:
+            return super().num_pages
+        # Номера страниц при курсорах условны: текущая страница имеет
+        # номер 1 или 2, а «следующая» существует, если есть ещё записи.
+        self.get_cursor_page()
+        number = self._number()
+        return number + 1 if self._has_next() else number
+
+    def _number(self):
+        return 2 if self._has_previous() else 1
+
+    def _has_next(self):
+        if self.before:
+            return True
+        return self._has_more
+
+    def _has_previous(self):
+        if self.before:
+            return self._has_more
+        return self.after is not None
+
+    def _keyset(self):
+        return keyset(self.object_list, self.after, self.before, self.key,
+                      descending=self.descending)
+
+    def get_cursor_page(self):
+        if self._has_more is None:
+            rows = list(self._keyset()[:self.per_page + 1])
+            self._has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if self.before:
+                rows.reverse()
+            self._rows = rows
+        return self._rows
+
+    def page(self, number):
+        if self.exact:
+            return super().page(number)
+        rows = self.get_cursor_page()
+        page = Page(rows, self._number(), self)
+        page.next_cursor = (
+            encode_cursor(rows[-1], self.key)
+            if rows and self._has_next() else None
+        )
+        page.previous_cursor = (
+            encode_cursor(rows[0], self.key)
+            if rows and self._has_previous() else None
+        )
+        return page
+
+    def get_page(self, number):
+        if self.exact:
+            return super().get_page(number)
+        return self.page(number)
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE, exact=False,
+             key='pub_date', descending=True):
+    """Возвращает страницу ленты для запроса.
+
+    Параметр ?page=N включает режим точных номеров страниц, без него
+    лента листается курсорами ?after=... и ?before=....
+    """
+    page_number = request.GET.get('page')
+    paginator = CursorPaginator(
+        object_list,
+        per_page,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        exact=exact or page_number is not None,
+        key=key,
+        descending=descending,
+    )
+    return paginator.get_page(page_number)
+
+
+def paginate_lazily(request, object_list, **kwargs):
+    """paginate(), который выполняется при первом обращении к странице.
+
+    Для лент с кэшем фрагмента: ключ фрагмента строится из параметров
+    запроса, и при попадании запросы страницы (и COUNT в режиме
+    ?page=N) не выполняются.
+    """
+    return SimpleLazyObject(lambda: paginate(request, object_list, **kwargs))
@@ -0,0 +1,88 @@
+"""Профилирование медленных запросов.
+
+Поток-сэмплер раз в PROFILE_SAMPLE_INTERVAL секунд снимает стеки
+потоков, которые сейчас обрабатывают запросы. Если запрос оказался
+медленнее порога, накопленные стеки пишутся в формате collapsed
+(строка «корень;...;лист число»), который понимают flamegraph.pl
+и speedscope. Быстрые запросы просто забываются, поэтому сэмплер
+можно держать включённым в продакшене.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.utils import timezone
+
+_lock = threading.Lock()
+_active = {}
+_sampler = None
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return (f'{code.co_name} '
+            f'({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='request-sampler', daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with _lock:
+                for thread_id, stacks in _active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+def start_sampling(interval, stacks=None):
+    """Начинает сэмплирование текущего потока; возвращает счётчик
+    стеков, который заполняется до stop_sampling(). Переданный stacks
+    продолжает уже начатый счётчик (следующая часть потокового ответа).
+    """
+    global _sampler
+    stacks = Counter() if stacks is None else stacks
+    with _lock:
+        # После fork поток сэмплера в дочернем процессе не существует.
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = Sampler(interval)
+            _sampler.start()
+        _active[threading.get_ident()] = stacks
+    return stacks
+
+
+def stop_sampling():
+    with _lock:
+        return _active.pop(threading.get_ident(), Counter())
+
+
+def profile_path(directory, view_name, duration, extension):
+    """Путь файла профиля, помеченного именем URL и длительностью."""
+    os.makedirs(directory, exist_ok=True)
+    tag = re.sub(r'[^\w.-]', '_', view_name.replace(':', '.'))
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S-%f')
+    return os.path.join(
+        directory, f'{stamp}-{tag}-{duration * 1000:.0f}ms.{extension}'
+    )
+
+
+def write_collapsed(path, stacks):
+    with open(path, 'w', encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
@@ -0,0 +1,34 @@
+"""Бэкенд sqlite3 с настройкой соединений.
+
+OPTIONS['pragmas'] выполняются на каждом новом соединении: журнал WAL
+и прочие прагмы соединения не переживают его закрытия (кроме самого
+journal_mode), а при постоянных соединениях (CONN_MAX_AGE) это
+происходит редко. OPTIONS['transaction_mode'] задаёт вид BEGIN для
+atomic(): при IMMEDIATE транзакция сразу берёт блокировку записи
+и ждёт её по busy_timeout. Отложенная транзакция, которая сначала
+читает, а потом пишет, при занятой блокировке сразу получает
+«database is locked». Поэтому atomic() в коде оборачивает только
+запись, а чтение (подсчёты, проверки) идёт до него.
+"""
+from django.db.backends.sqlite3 import base
+
+CUSTOM_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for name in CUSTOM_OPTIONS:
+            params.pop(name, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,57 @@
+"""Хранилище статики с хешами в именах и сжатыми копиями.
+
+collectstatic записывает файлы с хешем содержимого в имени
+(ManifestStaticFilesStorage), а рядом с текстовыми файлами -
+сжатые копии .gz и, если установлен модуль brotli, .br. Сжатие
+делается один раз при сборке, а не на каждый запрос; копия
+сохраняется, только если она заметно меньше оригинала.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.svg', '.ico', '.txt', '.html', '.json', '.xml',
+)
+# Копия сохраняется, если она меньше оригинала хотя бы на 5%.
+MIN_SAVING = 0.05
+
+
+def compressors():
+    yield '.gz', lambda data: gzip.compress(data, 9, mtime=0)
+    if brotli is not None:
+        # 11 - максимальное качество brotli.
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) < len(data) * (1 - MIN_SAVING):
+                with open(path + extension, 'wb') as file:
+                    file.write(compressed)
+            elif os.path.exists(path + extension):
+                os.remove(path + extension)
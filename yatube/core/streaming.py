@@ -0,0 +1,254 @@
+"""Потоковый рендер страниц.
+
+render_page отдаёт страницу как StreamingHttpResponse. Шаблон
+обходится по узлам, и готовый текст уходит клиенту частями. Первая
+часть - <head> и шапка base.html до тега {% flush %}. Дальше текст
+копится до CHUNK_SIZE символов. Наследование, блоки, {% include %},
+{% for %} и {% cache %} (при промахе) раскрываются, поэтому длинный
+список постов или комментариев не собирается в одну строку. Остальные
+теги рендерятся как обычно.
+
+Потоковая часть выполняется после middleware. Замеры, профиль
+и поиск повторов оборачивают streaming_content в MeasuredStream
+и подводят итог, когда поток исчерпан или закрыт.
+"""
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.defaulttags import CsrfTokenNode, ForNode
+from django.template.loader import get_template
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode, IncludeNode,
+)
+from django.templatetags.cache import CacheNode
+from django.utils.safestring import mark_safe
+
+from . import metrics
+from .templatetags.streaming import FlushNode
+
+CHUNK_SIZE = 16 * 1024
+FLUSH = object()
+
+
+def _nodes(nodelist, context):
+    for node in nodelist:
+        handler = HANDLERS.get(type(node))
+        if handler is None:
+            yield node.render_annotated(context)
+        else:
+            yield from handler(node, context)
+
+
+def _flush(node, context):
+    yield FLUSH
+
+
+def _extends(node, context):
+    # Повторяет ExtendsNode.render, но обходит узлы родителя.
+    parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+    for child in parent.nodelist:
+        if not isinstance(child, TextNode):
+            if not isinstance(child, ExtendsNode):
+                block_context.add_blocks({
+                    block.name: block
+                    for block in parent.nodelist.get_nodes_by_type(BlockNode)
+                })
+            break
+    with context.render_context.push_state(parent, isolated_context=False):
+        yield from _nodes(parent.nodelist, context)
+
+
+def _block(node, context):
+    # Повторяет BlockNode.render.
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            yield from _nodes(node.nodelist, context)
+            return
+        push = block = block_context.pop(node.name)
+        if block is None:
+            block = node
+        block = type(node)(block.name, block.nodelist)
+        block.context = context
+        context['block'] = block
+        yield from _nodes(block.nodelist, context)
+        if push is not None:
+            block_context.push(node.name, push)
+
+
+def _include(node, context):
+    template = node.template.resolve(context)
+    if node.isolated_context or not isinstance(template, str):
+        yield node.render_annotated(context)
+        return
+    template = context.template.engine.get_template(template)
+    values = {
+        name: var.resolve(context)
+        for name, var in node.extra_context.items()
+    }
+    with context.push(**values), context.render_context.push_state(template):
+        yield from _nodes(template.nodelist, context)
+
+
+def _for(node, context):
+    """Цикл без распаковки и reversed; forloop - как у ForNode."""
+    if node.is_reversed or len(node.loopvars) > 1:
+        yield node.render_annotated(context)
+        return
+    parentloop = context['forloop'] if 'forloop' in context else {}
+    with context.push():
+        values = node.sequence.resolve(context, ignore_failures=True)
+        if values is None:
+            values = []
+        if not hasattr(values, '__len__'):
+            values = list(values)
+        length = len(values)
+        if not length:
+            yield from _nodes(node.nodelist_empty, context)
+            return
+        loop = context['forloop'] = {'parentloop': parentloop}
+        for index, item in enumerate(values):
+            loop.update(
+                counter0=index, counter=index + 1,
+                revcounter=length - index, revcounter0=length - index - 1,
+                first=index == 0, last=index == length - 1,
+            )
+            context[node.loopvars[0]] = item
+            yield from _nodes(node.nodelist_loop, context)
+
+
+def _cache(node, context):
+    """При промахе фрагмент отдаётся по частям и кладётся в кэш
+    после рендера, как у CacheNode."""
+    if node.cache_name:
+        yield node.render_annotated(context)
+        return
+    try:
+        fragment_cache = caches['template_fragments']
+    except InvalidCacheBackendError:
+        fragment_cache = caches['default']
+    expire_time = node.expire_time_var.resolve(context)
+    key = make_template_fragment_key(
+        node.fragment_name, [var.resolve(context) for var in node.vary_on])
+    value = fragment_cache.get(key)
+    if value is not None:
+        yield value
+        return
+    parts = []
+    for part in _nodes(node.nodelist, context):
+        if part is not FLUSH:
+            parts.append(part)
+        yield part
+    fragment_cache.set(
+        key, mark_safe(''.join(parts)),
+        None if expire_time is None else int(expire_time),
+    )
+
+
+HANDLERS = {
+    FlushNode: _flush,
+    ExtendsNode: _extends,
+    BlockNode: _block,
+    IncludeNode: _include,
+    ForNode: _for,
+    CacheNode: _cache,
+}
+
+
+def _chunks(parts, size):
+    buffer, length = [], 0
+    for part in parts:
+        if part is not FLUSH:
+            buffer.append(part)
+            length += len(part)
+        if buffer and (part is FLUSH or length >= size):
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _timed(chunks):
+    # Время шаблонов, как у TimedTemplate, но по частям: паузы между
+    # частями (запись клиенту) не учитываются.
+    while True:
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            started = request_metrics.template_started()
+        try:
+            chunk = next(chunks, None)
+        finally:
+            if request_metrics is not None:
+                request_metrics.template_finished(started)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def stream_template(template, context=None, request=None, size=CHUNK_SIZE):
+    """Части страницы; template - скомпилированный django.template."""
+    context = make_context(
+        context, request, autoescape=template.engine.autoescape)
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            yield from _timed(
+                _chunks(_nodes(template.nodelist, context), size))
+
+
+class MeasuredStream:
+    """Обёртка streaming_content для middleware с замерами.
+
+    Каждая часть готовится внутри activate() - контекста, который
+    заново включает замеры запроса. finished(size) вызывается один раз,
+    когда поток исчерпан или закрыт (response.close() закрывает и эту
+    обёртку); size - число отданных байт.
+    """
+
+    def __init__(self, content, activate, finished):
+        self.iterator = iter(content)
+        self.activate = activate
+        self.finished = finished
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.activate():
+            chunk = next(self.iterator, None)
+        if chunk is None:
+            self.close()
+            raise StopIteration
+        self.size += len(chunk)
+        return chunk
+
+    def close(self):
+        finished, self.finished = self.finished, None
+        if finished is not None:
+            finished(self.size)
+
+
+def render_page(request, template_name, context=None):
+    """render() или, при STREAMING_PAGES, потоковый ответ.
+
+    CSRF-токен создаётся заранее, если он есть в шаблоне (без учёта
+    include): после ответа middleware уже не выставит cookie, а сжатие
+    не узнает, что в странице есть секрет.
+    """
+    if not settings.STREAMING_PAGES:
+        return render(request, template_name, context)
+    template = get_template(template_name).template
+    if template.nodelist.get_nodes_by_type(CsrfTokenNode):
+        get_token(request)
+    return StreamingHttpResponse(stream_template(template, context, request))
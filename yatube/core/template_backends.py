@@ -0,0 +1,27 @@
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        request_metrics = metrics.current()
+        if request_metrics is None:
+            return super().render(context, request)
+        started = request_metrics.template_started()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_finished(started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, который учитывает время рендера в замерах
+    RequestMetricsMiddleware."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
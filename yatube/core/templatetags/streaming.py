@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+class FlushNode(template.Node):
+    def render(self, context):
+        return ''
+
+
+@register.tag
+def flush(parser, token):
+    """Здесь потоковый рендер (core.streaming) отправляет клиенту
+    накопленный текст. При обычном рендере ничего не выводит."""
+    return FlushNode()
@@ -0,0 +1,37 @@
+"""Запуск тестов с временным кэшем.
+
+Тесты чистят кэш (cache.clear()) и пишут в него версии лент. Чтобы
+не трогать BASE_DIR/cache, файлы SQLiteCache на время тестов
+переносятся во временный каталог, как MEDIA_ROOT в тестах форм.
+"""
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def temporary_caches(directory):
+    """CACHES, в которых файлы SQLiteCache лежат в directory."""
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, cache in caches.items():
+        if cache['BACKEND'] == 'core.cache.SQLiteCache':
+            cache['LOCATION'] = os.path.join(directory, f'{alias}.sqlite3')
+    return caches
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_settings = override_settings(
+            CACHES=temporary_caches(self.cache_dir))
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
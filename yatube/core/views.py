@@ -1,5 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +19,13 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def request_metrics(request):
+    """Сводка замеров запросов этого процесса по именам URL."""
+    if request.GET.get('reset'):
+        metrics.reset()
+    return JsonResponse(
+        metrics.summary(), json_dumps_params={'ensure_ascii': False}
+    )
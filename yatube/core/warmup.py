@@ -0,0 +1,116 @@
+"""Прогрев воркера перед приёмом трафика.
+
+Компилирует все шаблоны (с cached.Loader они остаются в памяти
+процесса), заполняет таблицы URL и делает первые запросы к страницам
+WARM_UP_URLS через полный стек middleware: так заполняются ленивые
+импорты, версии лент, поисковый индекс и кэш фрагментов.
+
+Прогрев запускается командой warm_up (шаг деплоя) и, при
+WARM_UP_ON_START, из yatube/wsgi.py сразу после загрузки приложения
+(warm_up_on_start). Ошибка прогрева там только пишется в лог:
+приложение всё равно загружается и принимает запросы. При запуске
+с --preload прогретое состояние наследуют воркеры после fork.
+"""
+import logging
+import os
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.test import Client
+from django.urls import get_resolver, reverse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _loader_dirs(loaders):
+    for loader in loaders:
+        # cached.Loader оборачивает другие загрузчики.
+        if hasattr(loader, 'loaders'):
+            yield from _loader_dirs(loader.loaders)
+        else:
+            yield from loader.get_dirs()
+
+
+def template_names(engine):
+    """Имена всех шаблонов, которые видят загрузчики движка."""
+    names = set()
+    for directory in _loader_dirs(engine.template_loaders):
+        for root, _, files in os.walk(directory):
+            for file in files:
+                if file.startswith('.'):
+                    continue
+                path = os.path.relpath(os.path.join(root, file), directory)
+                names.add(path.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def compile_templates():
+    """Компилирует шаблоны; возвращает число шаблонов и ошибки."""
+    compiled, errors = 0, []
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        for name in template_names(backend.engine):
+            try:
+                backend.engine.get_template(name)
+            except (TemplateSyntaxError, TemplateDoesNotExist,
+                    UnicodeDecodeError) as error:
+                errors.append(f'{name}: {error}')
+            else:
+                compiled += 1
+    return compiled, errors
+
+
+def _host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def request_pages(urls):
+    """Запрашивает страницы; возвращает код ответа или ошибку
+    для каждого адреса. Ошибка страницы не должна мешать запуску
+    воркера."""
+    client = Client(HTTP_HOST=_host())
+    results = {}
+    for url in urls:
+        try:
+            response = client.get(reverse(url))
+            # Потоковая страница рендерится только при чтении тела.
+            if response.streaming:
+                b''.join(response.streaming_content)
+            response.close()
+            results[url] = response.status_code
+        except Exception as error:
+            results[url] = repr(error)
+    return results
+
+
+def warm_up(log=lambda message: None):
+    compiled, errors = compile_templates()
+    log(f'Шаблонов скомпилировано: {compiled}')
+    for error in errors:
+        log(f'Ошибка шаблона {error}')
+    get_resolver().url_patterns
+    for url, status in request_pages(settings.WARM_UP_URLS).items():
+        log(f'{url}: {status}')
+    # Прогревочные запросы не должны попадать в статистику, а
+    # соединения с базой - наследоваться воркерами после fork.
+    metrics.reset()
+    connections.close_all()
+    return errors
+
+
+def warm_up_on_start():
+    """Прогрев из yatube/wsgi.py; ошибки не мешают загрузке."""
+    if not settings.WARM_UP_ON_START:
+        return
+    try:
+        warm_up(log=logger.info)
+    except Exception:
+        logger.exception('Не удалось прогреть воркер')
@@ -0,0 +1,251 @@
+"""Нагрузочный прогон представлений posts.
+
+Заполняет базу синтетическими данными, прогоняет страницы через
+тестовый клиент (полный WSGI-стек с middleware) и считает перцентили
+времени ответа, число SQL-запросов и пик выделенной памяти.
+Результаты сравниваются с сохранённым базовым прогоном.
+"""
+import io
+import json
+import math
+import multiprocessing
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import close_old_connections, connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import seeding
+from .models import Follow, Group, Post
+from .seeding import SEED_UNTIL, SeedPlan
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+# Допустимый рост p95 относительно базового прогона.
+DEFAULT_TOLERANCE = 0.2
+
+Dataset = namedtuple('Dataset', 'reader author group post')
+Scenario = namedtuple('Scenario', 'name method url data')
+# Доля пишущих запросов в смешанной нагрузке.
+DEFAULT_WRITE_RATIO = 0.2
+
+
+def seed_dataset(users=50, groups=5, posts=1000, comments=2000,
+                 follows=200, images=20, seed=0):
+    """Создаёт синтетические данные; одинаковый seed - одинаковая база."""
+    plan = SeedPlan(
+        seed=seed, users=users, groups=groups, posts=posts,
+        comments=comments, follows_per_user=follows / users,
+        images=images, image_ratio=images / posts if posts else 0,
+        days=30, until=SEED_UNTIL,
+    )
+    bases = seeding.seed(plan, log=lambda message: None)
+    call_command('rebuild_counters', stdout=io.StringIO())
+    seeding.rebuild_derived(bases, log=lambda message: None)
+
+    # Самый активный читатель и самый популярный автор.
+    follows = Follow.objects.filter(user_id__gte=bases.user)
+    reader_id = follows.values('user').annotate(
+        total=Count('pk')).order_by('-total', 'user')[0]['user']
+    author_id = follows.values('author').annotate(
+        total=Count('pk')).order_by('-total', 'author')[0]['author']
+    return Dataset(
+        reader=User.objects.get(pk=reader_id),
+        author=User.objects.get(pk=author_id),
+        group=Group.objects.get(pk=bases.group),
+        post=Post.objects.filter(author_id=author_id).first(),
+    )
+
+
+def scenarios(dataset):
+    return [
+        Scenario('posts:index', 'get', reverse('posts:index'), None),
+        Scenario('posts:group_list', 'get', reverse(
+            'posts:group_list', kwargs={'slug': dataset.group.slug}), None),
+        Scenario('posts:profile', 'get', reverse(
+            'posts:profile', kwargs={'username': dataset.author.username}),
+            None),
+        Scenario('posts:post_detail', 'get', reverse(
+            'posts:post_detail', kwargs={'post_id': dataset.post.pk}), None),
+        Scenario('posts:follow_index', 'get',
+                 reverse('posts:follow_index'), None),
+        Scenario('posts:add_comment', 'post', reverse(
+            'posts:add_comment', kwargs={'post_id': dataset.post.pk}),
+            {'text': 'Комментарий из бенчмарка'}),
+    ]
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def consume(response):
+    """Дочитывает потоковый ответ: без этого страница не рендерится."""
+    if response.streaming:
+        b''.join(response.streaming_content)
+    response.close()
+
+
+def measure(client, scenario, requests=50, warmup=5):
+    """Прогоняет сценарий и возвращает сводку по нему."""
+    send = getattr(client, scenario.method)
+    for _ in range(warmup):
+        send(scenario.url, scenario.data)
+    timings, queries = [], []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(scenario.url, scenario.data)
+            consume(response)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+    tracemalloc.start()
+    try:
+        consume(send(scenario.url, scenario.data))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result = {
+        f'p{percent}': round(percentile(timings, percent), 2)
+        for percent in PERCENTILES
+    }
+    result.update(
+        status=response.status_code,
+        queries=max(queries),
+        peak_kib=round(peak / 1024, 1),
+    )
+    return result
+
+
+def run(dataset, requests=50, warmup=5):
+    client = Client()
+    client.force_login(dataset.reader)
+    return {
+        scenario.name: measure(client, scenario, requests, warmup)
+        for scenario in scenarios(dataset)
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Список регрессий относительно базового прогона."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {result['p95']} мс, было {base['p95']} мс"
+            )
+        if result['queries'] > base['queries']:
+            regressions.append(
+                f"{name}: запросов {result['queries']}, "
+                f"было {base['queries']}"
+            )
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2,
+                  sort_keys=True)
+
+
+def mixed_scenarios(dataset):
+    """Чтения - страницы из scenarios(), запись - комментарий или пост."""
+    reads = [item for item in scenarios(dataset) if item.method == 'get']
+    writes = [
+        item for item in scenarios(dataset) if item.method == 'post'
+    ] + [
+        Scenario('posts:post_create', 'post', reverse('posts:post_create'),
+                 {'text': 'Пост из бенчмарка'}),
+    ]
+    return reads, writes
+
+
+def _worker(user, reads, writes, requests, write_ratio, seed):
+    client = Client()
+    client.force_login(user)
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(requests):
+        write = rng.random() < write_ratio
+        scenario = rng.choice(writes if write else reads)
+        started = time.perf_counter()
+        try:
+            response = getattr(client, scenario.method)(
+                scenario.url, scenario.data)
+            consume(response)
+            failed = response.status_code >= 500
+        except Exception:
+            # Например, «database is locked».
+            failed = True
+        finally:
+            # Тестовый клиент не закрывает соединения после запроса,
+            # сервер закрывает их по request_finished с учётом
+            # CONN_MAX_AGE.
+            close_old_connections()
+        samples.append((
+            'write' if write else 'read',
+            (time.perf_counter() - started) * 1000, failed,
+        ))
+    connections.close_all()
+    return samples
+
+
+def mixed_load(dataset, workers=8, requests=100,
+               write_ratio=DEFAULT_WRITE_RATIO, seed=0):
+    """Смешанная нагрузка: workers процессов (как воркеры WSGI-сервера)
+    по requests запросов, доля write_ratio из них пишет. Сводка по
+    чтениям и записям и общая пропускная способность, запросов в
+    секунду. Потоки здесь не годятся: из-за GIL они упираются
+    в Python раньше, чем в блокировки базы."""
+    reads, writes = mixed_scenarios(dataset)
+    users = list(User.objects.order_by('pk')[:workers])
+    # Дочерние процессы не должны наследовать открытые соединения.
+    connections.close_all()
+    started = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+    ) as pool:
+        futures = [
+            pool.submit(
+                _worker, users[number % len(users)], reads, writes,
+                requests, write_ratio, seed + number,
+            )
+            for number in range(workers)
+        ]
+        samples = [item for future in futures for item in future.result()]
+    elapsed = time.perf_counter() - started
+    result = {'throughput': round(len(samples) / elapsed, 1)}
+    for kind in ('read', 'write'):
+        timings = [item[1] for item in samples if item[0] == kind]
+        if not timings:
+            continue
+        result[kind] = {
+            f'p{percent}': round(percentile(timings, percent), 2)
+            for percent in PERCENTILES
+        }
+        result[kind].update(
+            requests=len(timings),
+            errors=sum(1 for item in samples
+                       if item[0] == kind and item[2]),
+        )
+    return result
@@ -0,0 +1,53 @@
+"""Пакетное создание постов и комментариев.
+
+bulk_create не шлёт сигналы, поэтому всё, что сигналы делают для
+одной записи (поисковый индекс, счётчики, ленты подписок, версии
+кэша лент), здесь делается один раз на пачку.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from .cache import bump_feed_versions, post_feeds
+from .models import Comment, Post, UserCounters
+from .search import index_posts
+from .timeline import fan_out_posts
+
+
+def _assign_pks(model, objs):
+    """SQLite не возвращает ключи из bulk_create. Внутри транзакции
+    после первой вставки других писателей нет, поэтому новые строки
+    получили подряд идущие rowid, последний из которых - максимум."""
+    if not objs or objs[0].pk is not None:
+        return
+    last = model.objects.aggregate(pk=Max('pk'))['pk']
+    for pk, obj in zip(range(last - len(objs) + 1, last + 1), objs):
+        obj.pk = pk
+
+
+def create_posts(author, posts):
+    """Сохраняет посты автора одной транзакцией."""
+    for post in posts:
+        post.author = author
+    with transaction.atomic():
+        Post.objects.bulk_create(posts)
+        _assign_pks(Post, posts)
+        index_posts(posts)
+        UserCounters.change(author.pk, 'posts', len(posts))
+        fan_out_posts(author.pk, posts)
+    bump_feed_versions(*set().union(*map(post_feeds, posts)))
+    return posts
+
+
+def create_comments(author, comments):
+    """Сохраняет комментарии автора одной транзакцией; посты
+    комментариев (comment.post) должны быть загружены."""
+    for comment in comments:
+        comment.author = author
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        _assign_pks(Comment, comments)
+        UserCounters.change(author.pk, 'comments', len(comments))
+    # Число комментариев выводится в лентах постов.
+    bump_feed_versions(*set().union(
+        *(post_feeds(comment.post) for comment in comments)))
+    return comments
@@ -0,0 +1,117 @@
+"""Версии кэша лент.
+
+Фрагменты лент кэшируются под ключом, в который входит версия ленты.
+Сигналы Post, Group и Comment увеличивают версии затронутых лент,
+поэтому устаревший фрагмент больше не запрашивается и вытесняется
+по таймауту, а не раздаётся до его истечения.
+"""
+import random
+import time
+
+from django.core.cache import cache
+
+FEED_CACHE_TIMEOUT = 60 * 15
+FEED_CACHE_JITTER = 60
+VERSION_KEY_PREFIX = 'feed-version'
+MODIFIED_KEY_PREFIX = 'feed-modified'
+
+# Группа может выводиться в любой ленте, поэтому её изменение
+# сбрасывает все ленты сразу.
+GROUPS_FEED = 'groups'
+
+
+def index_feed():
+    return 'index'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def following_feed(user_id):
+    """Подписки читателя: от них зависят кнопки «Подписаться»."""
+    return f'following:{user_id}'
+
+
+def _version_key(feed):
+    return f'{VERSION_KEY_PREFIX}:{feed}'
+
+
+def _modified_key(feed):
+    return f'{MODIFIED_KEY_PREFIX}:{feed}'
+
+
+def feed_state(*feeds):
+    """Версия лент и время их последнего изменения (unix-время)
+    одним обращением к кэшу."""
+    feeds = feeds + (GROUPS_FEED,)
+    version_keys = [_version_key(feed) for feed in feeds]
+    modified_keys = [_modified_key(feed) for feed in feeds]
+    found = cache.get_many(version_keys + modified_keys)
+    now = time.time()
+    # Начальная версия берётся от времени: если ключ версии вытеснен,
+    # старые фрагменты с маленькими версиями не оживут. Неизвестное
+    # время изменения считается текущим.
+    missing = {
+        key: int(now * 1000) for key in version_keys if key not in found
+    }
+    missing.update(
+        (key, now) for key in modified_keys if key not in found
+    )
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return (
+        '.'.join(str(found[key]) for key in version_keys),
+        max(found[key] for key in modified_keys),
+    )
+
+
+def feed_versions(*feeds):
+    """Текущие версии лент одним обращением к кэшу."""
+    return feed_state(*feeds)[0]
+
+
+def bump_feed_versions(*feeds):
+    now = time.time()
+    for feed in feeds:
+        key = _version_key(feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(now * 1000), None)
+    cache.set_many({_modified_key(feed): now for feed in feeds}, None)
+
+
+def feed_cache_context(*feeds):
+    """Контекст для тега {% cache %} в шаблонах лент.
+
+    Таймаут случайно растянут, чтобы фрагменты разных лент
+    не истекали одновременно.
+    """
+    return {
+        'feed_version': feed_versions(*feeds),
+        'feed_cache_timeout': (
+            FEED_CACHE_TIMEOUT + random.randint(0, FEED_CACHE_JITTER)
+        ),
+    }
+
+
+def post_feeds(post, *group_ids):
+    """Ленты, в которых выводится пост."""
+    feeds = {index_feed(), profile_feed(post.author_id)}
+    feeds.update(
+        group_feed(group_id)
+        for group_id in (post.group_id, *group_ids)
+        if group_id is not None
+    )
+    return feeds
+
+
+def bump_post_feeds(post, *group_ids):
+    """Сбрасывает ленты, в которых выводится пост."""
+    bump_feed_versions(*post_feeds(post, *group_ids))
@@ -0,0 +1,55 @@
+"""Условные GET для лент и страницы поста.
+
+Валидаторы строятся из версий лент (posts.cache), поэтому ответ 304
+отдаётся без запросов к строкам страницы. Версии увеличиваются
+сигналами при любом изменении поста, группы или комментария, в том
+числе при правке, которая не меняет pub_date. В ETag входят также
+адрес со строкой запроса (страница, курсор, поиск) и пользователь:
+кнопки правки и подписки у каждого свои.
+"""
+import hashlib
+from collections import namedtuple
+
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from .cache import feed_state
+
+Validators = namedtuple('Validators', 'etag last_modified')
+
+
+def feed_validators(request, *feeds, variant=''):
+    """variant различает представления одного адреса, например
+    формат ответа API."""
+    version, modified = feed_state(*feeds)
+    key = ':'.join((
+        version, str(request.user.pk or ''), request.get_full_path(),
+        variant,
+    ))
+    return Validators(
+        etag=quote_etag(hashlib.md5(key.encode()).hexdigest()),
+        last_modified=int(modified),
+    )
+
+
+def set_validators(response, validators):
+    response['ETag'] = validators.etag
+    response['Last-Modified'] = http_date(validators.last_modified)
+    # Страница зависит от сессии, а без Cache-Control браузер
+    # может показывать её по Last-Modified без перепроверки.
+    patch_vary_headers(response, ('Cookie',))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified(request, validators):
+    """Ответ 304, если у клиента актуальная версия страницы."""
+    response = get_conditional_response(
+        request, etag=validators.etag,
+        last_modified=validators.last_modified,
+    )
+    if response is not None:
+        return set_validators(response, validators)
+    return None
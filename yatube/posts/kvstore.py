@@ -0,0 +1,102 @@
+"""Хранилище метаданных миниатюр sorl-thumbnail.
+
+Метаданные лежат в таблице базы (модель sorl KVStore), поэтому
+переживают перезапуск и общие для всех процессов. Перед таблицей
+стоит LRU-кэш процесса, а prefetch() загружает записи для всех
+картинок страницы ленты одним запросом.
+"""
+import threading
+from collections import OrderedDict
+
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+LRU_SIZE = 10000
+
+# Отметка «ключа нет в базе», чтобы не повторять запрос.
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class KVStore(KVStoreBase):
+    def __init__(self):
+        super().__init__()
+        self.lru = LRUCache(LRU_SIZE)
+
+    def prefetch(self, image_files):
+        """Загружает в LRU записи нескольких картинок одним запросом."""
+        keys = {add_prefix(image_file.key) for image_file in image_files}
+        keys = [key for key in keys if self.lru.get(key) is None]
+        if not keys:
+            return
+        found = dict(
+            KVStoreModel.objects.filter(key__in=keys)
+            .values_list('key', 'value')
+        )
+        for key in keys:
+            self.lru.set(key, found.get(key, MISSING))
+
+    def clear(self, delete_thumbnails=False):
+        KVStoreModel.objects.filter(
+            key__startswith=settings.THUMBNAIL_KEY_PREFIX
+        ).delete()
+        self.lru.clear()
+        if delete_thumbnails:
+            self.delete_all_thumbnail_files()
+
+    def _get_raw(self, key):
+        value = self.lru.get(key)
+        if value is None:
+            value = KVStoreModel.objects.filter(key=key).values_list(
+                'value', flat=True
+            ).first()
+            self.lru.set(key, MISSING if value is None else value)
+        if value is MISSING:
+            return None
+        return value
+
+    def _set_raw(self, key, value):
+        KVStoreModel.objects.update_or_create(
+            key=key, defaults={'value': value}
+        )
+        self.lru.set(key, value)
+
+    def _delete_raw(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        for key in keys:
+            self.lru.delete(key)
+
+    def _find_keys_raw(self, prefix):
+        return KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True)
@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmark_baseline.json')
+DUMMY_CACHE = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+# Профили базы для смешанной нагрузки: «до» - настройки sqlite3
+# по умолчанию, «после» - SQLITE_PRODUCTION.
+DATABASE_PROFILES = (
+    ('default', {'CONN_MAX_AGE': 0, 'OPTIONS': {}}),
+    ('production', settings.SQLITE_PRODUCTION),
+)
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет страницы posts на синтетических данных во временной '
+            'базе и сравнивает перцентили с базовым прогоном.')
+
+    def add_arguments(self, parser):
+        sizes = (
+            ('users', 50), ('groups', 5), ('posts', 1000),
+            ('comments', 2000), ('follows', 200), ('images', 20),
+        )
+        for name, default in sizes:
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Число замеряемых запросов на страницу.'
+        )
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Замерять без кэша (DummyCache).'
+        )
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результаты как новый базовый прогон.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmark.DEFAULT_TOLERANCE
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=0,
+            help=('Вместо последовательного прогона дать смешанную '
+                  'нагрузку из стольких процессов на файловую базу '
+                  'с профилями default и production.')
+        )
+        parser.add_argument(
+            '--write-ratio', type=float,
+            default=benchmark.DEFAULT_WRITE_RATIO,
+        )
+
+    def handle(self, *args, **options):
+        # Медиа и кэш прогона не смешиваются с рабочими.
+        media_root = tempfile.mkdtemp()
+        cache = {
+            **settings.CACHES['default'],
+            'LOCATION': os.path.join(media_root, 'cache.sqlite3'),
+        }
+        if options['no_cache']:
+            cache = DUMMY_CACHE
+        overrides = {'MEDIA_ROOT': media_root, 'CACHES': {'default': cache}}
+        if options['concurrency']:
+            # База в памяти не показывает блокировок файла.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(
+                media_root, 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(**overrides):
+                dataset = benchmark.seed_dataset(
+                    users=options['users'], groups=options['groups'],
+                    posts=options['posts'], comments=options['comments'],
+                    follows=options['follows'], images=options['images'],
+                    seed=options['seed'],
+                )
+                if options['concurrency']:
+                    loads = self.mixed_loads(dataset, options)
+                else:
+                    results = benchmark.run(
+                        dataset, options['requests'], options['warmup']
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = None
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['concurrency']:
+            self.report_mixed_loads(loads)
+            return
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<20} p50 {result['p50']:>8.2f} мс  "
+                f"p95 {result['p95']:>8.2f} мс  "
+                f"p99 {result['p99']:>8.2f} мс  "
+                f"запросов {result['queries']:>3}  "
+                f"память {result['peak_kib']:>8.1f} КиБ"
+            )
+
+        path = options['baseline']
+        if options['save_baseline']:
+            benchmark.save_baseline(path, results)
+            self.stdout.write(self.style.SUCCESS(
+                f'Базовый прогон записан в {path}'))
+            return
+        if not os.path.exists(path):
+            self.stdout.write('Базового прогона нет, сравнение пропущено.')
+            return
+        regressions = benchmark.compare(
+            results, benchmark.load_baseline(path), options['tolerance']
+        )
+        if regressions:
+            raise CommandError(
+                'Регрессии производительности:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def mixed_loads(self, dataset, options):
+        # Новые соединения потоков строятся по этому же словарю.
+        database = connection.settings_dict
+        saved = {name: database[name] for name in ('CONN_MAX_AGE', 'OPTIONS')}
+        loads = {}
+        try:
+            for name, profile in DATABASE_PROFILES:
+                database.update(profile)
+                connections.close_all()
+                loads[name] = benchmark.mixed_load(
+                    dataset, options['concurrency'], options['requests'],
+                    options['write_ratio'], options['seed'],
+                )
+        finally:
+            database.update(saved)
+            connections.close_all()
+        return loads
+
+    def report_mixed_loads(self, loads):
+        for name, load in loads.items():
+            self.stdout.write(
+                f"{name:<12} {load['throughput']:>8.1f} запросов/с")
+            for kind in ('read', 'write'):
+                result = load.get(kind)
+                if result is None:
+                    continue
+                self.stdout.write(
+                    f"  {kind:<10} p50 {result['p50']:>8.2f} мс  "
+                    f"p95 {result['p95']:>8.2f} мс  "
+                    f"p99 {result['p99']:>8.2f} мс  "
+                    f"запросов {result['requests']:>5}  "
+                    f"ошибок {result['errors']:>4}"
+                )
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.models import Comment, Follow, Post, UserCounters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики пользователей '
+            'и выводит найденные расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не сохраняя.'
+        )
+
+    @staticmethod
+    def _count(queryset, field):
+        return dict(
+            queryset.values_list(field).annotate(total=Count('pk'))
+            .order_by()
+        )
+
+    def handle(self, *args, **options):
+        actual = {
+            'posts': self._count(Post.objects, 'author'),
+            'followers': self._count(Follow.objects, 'author'),
+            'following': self._count(Follow.objects, 'user'),
+            'comments': self._count(Comment.objects, 'author'),
+        }
+        stored = UserCounters.objects.in_bulk()
+        to_create, to_update = [], []
+        for user_id in User.objects.values_list('pk', flat=True).iterator():
+            expected = {
+                field: actual[field].get(user_id, 0)
+                for field in UserCounters.FIELDS
+            }
+            counters = stored.get(user_id)
+            if counters is None:
+                to_create.append(UserCounters(user_id=user_id, **expected))
+                continue
+            drift = {
+                field: getattr(counters, field) - value
+                for field, value in expected.items()
+                if getattr(counters, field) != value
+            }
+            if drift:
+                self.stdout.write(f'user_id={user_id}: ' + ', '.join(
+                    f'{field} {value:+d}' for field, value in drift.items()
+                ))
+                for field, value in expected.items():
+                    setattr(counters, field, value)
+                to_update.append(counters)
+
+        if not options['dry_run']:
+            with transaction.atomic():
+                UserCounters.objects.bulk_create(to_create, batch_size=500)
+                UserCounters.objects.bulk_update(
+                    to_update, UserCounters.FIELDS, batch_size=500
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Расхождений: {len(to_update)}, '
+            f'пользователей без счётчиков: {len(to_create)}'
+        ))
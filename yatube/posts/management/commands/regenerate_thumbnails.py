@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from sorl.thumbnail import delete
+
+from posts.thumbnails import generate_thumbnails
+
+IMAGES_DIR = 'posts'
+
+
+def regenerate(image_name, force):
+    if force:
+        delete(image_name, delete_file=False)
+    generate_thumbnails(image_name)
+    return image_name
+
+
+class Command(BaseCommand):
+    help = ('Создаёт миниатюры всех размеров для картинок '
+            'из media/posts/ в несколько процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов (по умолчанию - число ядер).'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать уже существующие миниатюры.'
+        )
+
+    def handle(self, *args, **options):
+        if not default_storage.exists(IMAGES_DIR):
+            self.stdout.write('Картинок нет.')
+            return
+        _, files = default_storage.listdir(IMAGES_DIR)
+        images = [f'{IMAGES_DIR}/{name}' for name in files]
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+        done = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [
+                pool.submit(regenerate, image, options['force'])
+                for image in images
+            ]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as error:
+                    self.stderr.write(f'Ошибка: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done} из {len(images)}'
+        ))
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from posts.seeding import SEED_UNTIL, SeedPlan, rebuild_derived, seed
+
+
+def until_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками. При одинаковом seed '
+            'на пустой базе данные совпадают.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument(
+            '--follows-per-user', type=float, default=20,
+            help='Среднее число подписок пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=int, default=0,
+            help='Сколько картинок создать в MEDIA_ROOT/posts/.'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until публикуются посты.'
+        )
+        parser.add_argument(
+            '--until', type=until_date, default=SEED_UNTIL,
+            help='Дата последней публикации, ГГГГ-ММ-ДД.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Число процессов (0 - всё в текущем процессе).'
+        )
+
+    def handle(self, *args, **options):
+        plan = SeedPlan(
+            seed=options['seed'],
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows_per_user=options['follows_per_user'],
+            images=options['images'],
+            image_ratio=options['image_ratio'],
+            days=options['days'],
+            until=options['until'],
+        )
+        bases = seed(plan, options['workers'], log=self.stdout.write)
+        call_command('rebuild_counters', stdout=self.stdout)
+        rebuild_derived(bases, log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS('Готово.'))
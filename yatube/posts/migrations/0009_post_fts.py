@@ -0,0 +1,71 @@
+import re
+
+from django.db import OperationalError, migrations
+
+# Копия имени таблицы и токенизатора из posts.search на момент
+# миграции: миграция не должна зависеть от текущего кода приложения.
+# После изменения токенизатора индекс пересобирает rebuild_search_index.
+FTS_TABLE = 'posts_post_fts'
+MIN_STEM_LENGTH = 3
+WORD_RE = re.compile(r'\w+')
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ость', 'ости',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ым', 'им',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ую',
+    'юю', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ия', 'ть',
+    'ешь', 'ет', 'ют',
+    'ут', 'ат', 'ят', 'ит', 'ил', 'ла', 'ли', 'ло', 'ью', 'ии',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    for ending in RUSSIAN_ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD_RE.findall(text or '')]
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f"USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5 - поиск работает по индексу в памяти.
+            return
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+            [(pk, ' '.join(tokenize(text)))
+             for pk, text in Post.objects.values_list('id', 'text')]
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_auto_20220717_1830'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 05:36
+
+from django.db import migrations, models
+
+# Копия posts.timeline.PULL_AUTHOR_MIN_POSTS на момент миграции.
+PULL_AUTHOR_MIN_POSTS = 5000
+
+
+def mark_pulled(apps, schema_editor):
+    # Посты нынешних плодовитых авторов не разложены по лентам.
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    UserCounters.objects.filter(
+        posts__gte=PULL_AUTHOR_MIN_POSTS).update(pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_timeline_post_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounters',
+            name='pulled',
+            field=models.BooleanField(default=False, verbose_name='Подмешивается в ленты'),
+        ),
+        migrations.RunPython(mark_pulled, migrations.RunPython.noop),
+    ]
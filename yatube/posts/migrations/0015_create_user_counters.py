@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+
+def _counts(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(count=Count('pk')).order_by()
+    )
+
+
+def create_counters(apps, schema_editor):
+    # Счётчики создаются сразу у всех пользователей: сигналы сдвигают
+    # только уже созданные строки.
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    posts = _counts(Post.objects, 'author')
+    followers = _counts(Follow.objects, 'author')
+    following = _counts(Follow.objects, 'user')
+    comments = _counts(Comment.objects, 'author')
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True)
+    UserCounters.objects.bulk_create(
+        (
+            UserCounters(
+                user_id=pk,
+                posts=posts.get(pk, 0),
+                followers=followers.get(pk, 0),
+                following=following.get(pk, 0),
+                comments=comments.get(pk, 0),
+            )
+            for pk in missing.iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0014_usercounters_pulled'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
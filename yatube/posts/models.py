@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
 from core.models import CreatedModel
 
 User = get_user_model()
@@ -19,6 +20,25 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа одним JOIN, только поля,
+        которые выводят шаблоны, и число комментариев."""
+        comment_count = Comment.objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'author', 'group',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        ).annotate(comment_count=Coalesce(
+            models.Subquery(comment_count,
+                            output_field=models.IntegerField()), 0
+        ))
+
+
 class Post(models.Model):
     group = models.ForeignKey(Group, blank=True, null=True,
                               on_delete=models.PROTECT, related_name="posts",
@@ -35,6 +55,8 @@ class Post(models.Model):
     )
     image = models.ImageField('Картинка', upload_to='posts/', blank=True)
 
+    objects = PostQuerySet.as_manager()
+
     def __str__(self) -> str:
         return self.text[:15]
 
@@ -42,6 +64,13 @@ class Post(models.Model):
         verbose_name = "Список постов"
         verbose_name_plural = "Список постов"
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['pub_date'], name="post_date_idx"),
+            models.Index(fields=['author', 'pub_date'],
+                         name="post_author_date_idx"),
+            models.Index(fields=['group', 'pub_date'],
+                         name="post_group_date_idx"),
+        ]
 
 
 class Comment(CreatedModel, models.Model):
@@ -57,6 +86,12 @@ class Comment(CreatedModel, models.Model):
     text = models.TextField(verbose_name="Текст комментария",
                             help_text="Поле для записи комментария.")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name="comment_post_created_idx"),
+        ]
+
 
 class Follow(models.Model):
     author = models.ForeignKey(
@@ -77,3 +112,100 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['author', 'user'],
                                     name="unique_followers")
         ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются сигналами при создании и удалении постов, подписок
+    и комментариев. Строка создаётся вместе с пользователем (для
+    старых пользователей - миграцией), расхождения исправляет команда
+    rebuild_counters.
+    """
+    FIELDS = ('posts', 'followers', 'following', 'comments')
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+    # Посты автора хотя бы раз не раскладывались по лентам: они
+    # подмешиваются при чтении, даже если постов стало меньше порога.
+    pulled = models.BooleanField('Подмешивается в ленты', default=False)
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+    @staticmethod
+    def compute(user_id):
+        """Считает значения счётчиков по данным в базе."""
+        return {
+            'posts': Post.objects.filter(author_id=user_id).count(),
+            'followers': Follow.objects.filter(author_id=user_id).count(),
+            'following': Follow.objects.filter(user_id=user_id).count(),
+            'comments': Comment.objects.filter(author_id=user_id).count(),
+        }
+
+    @classmethod
+    def for_user(cls, user):
+        counters = cls.objects.filter(user_id=user.pk).first()
+        if counters is None:
+            # Без внешнего atomic(): при BEGIN IMMEDIATE он взял бы
+            # блокировку записи на время подсчёта. get_or_create сам
+            # открывает транзакцию только для INSERT.
+            counters, _ = cls.objects.get_or_create(
+                user_id=user.pk, defaults=cls.compute(user.pk)
+            )
+        return counters
+
+    @classmethod
+    def change(cls, user_id, field, delta):
+        """Атомарно сдвигает счётчик, если строка уже создана."""
+        counters = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            counters = counters.filter(**{f'{field}__gte': -delta})
+        counters.update(**{field: models.F(field) + delta})
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name='Автор поста',
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Лента подписок"
+        verbose_name_plural = "Ленты подписок"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name="timeline_user_date_post_idx"),
+            models.Index(fields=['user', 'author'],
+                         name="timeline_user_author_idx"),
+        ]
@@ -0,0 +1,265 @@
+"""Полнотекстовый поиск по постам.
+
+Основной индекс - виртуальная таблица SQLite FTS5, которая
+синхронизируется с Post через сигналы. Если FTS5 недоступна,
+используется инвертированный индекс в памяти процесса - только для
+разработки и запуска в один процесс. Поиск возвращает не больше
+SEARCH_RESULTS_LIMIT самых релевантных постов.
+"""
+import bisect
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.db import OperationalError, connection
+
+FTS_TABLE = 'posts_post_fts'
+SEARCH_RESULTS_LIMIT = 1000
+MIN_STEM_LENGTH = 3
+
+WORD_RE = re.compile(r'\w+')
+
+# Окончания русских словоформ, от длинных к коротким.
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ость', 'ости',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ым', 'им',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ую',
+    'юю', 'ов', 'ев', 'ах', 'ях', 'ам', 'ям', 'ом', 'ем', 'ия', 'ть',
+    'ешь', 'ет', 'ют',
+    'ут', 'ат', 'ят', 'ит', 'ил', 'ла', 'ли', 'ло', 'ью', 'ии',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+
+
+def stem(word):
+    """Приводит слово к нижнему регистру и отрезает окончание."""
+    word = word.lower().replace('ё', 'е')
+    for ending in RUSSIAN_ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    """Разбивает текст на основы слов."""
+    return [stem(word) for word in WORD_RE.findall(text or '')]
+
+
+class FTS5Backend:
+    """Индекс на виртуальной таблице FTS5, ранжирование по bm25."""
+
+    def index(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, body) '
+                f'VALUES (%s, %s)',
+                [post_id, ' '.join(tokenize(text))]
+            )
+
+    def index_many(self, posts):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, body) '
+                f'VALUES (%s, %s)',
+                [(pk, ' '.join(tokenize(text))) for pk, text in posts]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def search(self, stems, limit=SEARCH_RESULTS_LIMIT):
+        match = ' AND '.join(f'"{term}"*' for term in stems)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} '
+                f'MATCH %s ORDER BY rank LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def rebuild(self, posts):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, body) VALUES (%s, %s)',
+                [(pk, ' '.join(tokenize(text))) for pk, text in posts]
+            )
+
+
+class TokenIndexBackend:
+    """Инвертированный индекс в памяти процесса.
+
+    Строится лениво при первом поиске. Префиксы ищутся бинарным
+    поиском по отсортированному словарю, ранжирование - tf-idf.
+
+    Только для одного процесса: индекс обновляют сигналы своего
+    процесса, а посты, созданные или удалённые другими воркерами,
+    не видны до перезапуска. Для нескольких воркеров нужна FTS5.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._terms = []
+        self._documents = {}
+
+    def _ensure_built(self):
+        if self._postings is None:
+            from .models import Post
+            self.rebuild(Post.objects.values_list('id', 'text').iterator())
+
+    def _add(self, post_id, text):
+        counts = Counter(tokenize(text))
+        self._documents[post_id] = counts
+        for term, count in counts.items():
+            if term not in self._postings:
+                bisect.insort(self._terms, term)
+            self._postings[term][post_id] = count
+
+    def _discard(self, post_id):
+        for term in self._documents.pop(post_id, ()):
+            postings = self._postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    def index(self, post_id, text):
+        with self._lock:
+            if self._postings is None:
+                return
+            self._discard(post_id)
+            self._add(post_id, text)
+
+    def index_many(self, posts):
+        with self._lock:
+            if self._postings is None:
+                return
+            for post_id, text in posts:
+                self._discard(post_id)
+                self._add(post_id, text)
+
+    def remove(self, post_id):
+        with self._lock:
+            if self._postings is not None:
+                self._discard(post_id)
+
+    def _expand(self, prefix):
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, stems, limit=SEARCH_RESULTS_LIMIT):
+        self._ensure_built()
+        with self._lock:
+            total = len(self._documents) or 1
+            scores = None
+            for prefix in stems:
+                matched = defaultdict(float)
+                for term in self._expand(prefix):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for post_id, count in postings.items():
+                        matched[post_id] += count * idf
+                if scores is None:
+                    scores = matched
+                else:
+                    scores = {
+                        post_id: score + matched[post_id]
+                        for post_id, score in scores.items()
+                        if post_id in matched
+                    }
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [post_id for post_id, _ in ranked[:limit]]
+
+    def rebuild(self, posts):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._terms = []
+            self._documents = {}
+            for post_id, text in posts:
+                self._add(post_id, text)
+
+
+_fallback_backend = TokenIndexBackend()
+_fts5_ready = False
+
+
+def fts5_available():
+    global _fts5_ready
+    if _fts5_ready:
+        return True
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT 1 FROM {FTS_TABLE} LIMIT 0')
+    except OperationalError:
+        return False
+    _fts5_ready = True
+    return True
+
+
+def get_backend():
+    if fts5_available():
+        return FTS5Backend()
+    return _fallback_backend
+
+
+class SearchResults:
+    """Результаты поиска в порядке релевантности.
+
+    Пагинатор режет список id, и из базы загружаются только посты
+    текущей страницы.
+    """
+
+    def __init__(self, post_ids, queryset):
+        self.post_ids = post_ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = self.post_ids[index]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(keyword, queryset=None):
+    """Ищет посты по словам запроса (все слова, с префиксами)."""
+    from .models import Post
+    if queryset is None:
+        queryset = Post.objects.all()
+    stems = tokenize(keyword)
+    post_ids = get_backend().search(stems) if stems else []
+    return SearchResults(post_ids, queryset)
+
+
+def index_post(post):
+    get_backend().index(post.pk, post.text)
+
+
+def index_posts(posts):
+    get_backend().index_many([(post.pk, post.text) for post in posts])
+
+
+def unindex_post(post_id):
+    get_backend().remove(post_id)
+
+
+def rebuild_index():
+    from .models import Post
+    posts = Post.objects.values_list('id', 'text').iterator()
+    get_backend().rebuild(posts)
@@ -0,0 +1,329 @@
+"""Генератор синтетических данных в масштабе продакшена.
+
+Популярность авторов распределена по Ципфу: немногие авторы пишут
+большую часть постов и собирают большую часть подписчиков. Посты
+публикуются всплесками, комментарии концентрируются на части постов.
+
+Данные режутся на куски фиксированного размера, у каждого куска свой
+генератор случайных чисел, выведенный из общего seed, а первичные
+ключи назначаются явно. Поэтому результат на пустой базе одинаков
+при любом числе процессов.
+"""
+import io
+import random
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from PIL import Image, ImageDraw
+
+from .models import Comment, Follow, Group, Post, TimelineEntry
+from .search import rebuild_index
+from .timeline import BACKFILL_SIZE, pull_authors
+
+User = get_user_model()
+
+# Пачки bulk_create подбирает бэкенд базы (в SQLite их размер
+# ограничен числом параметров), явно задаётся только пачка pk__in.
+LOOKUP_BATCH_SIZE = 500
+CHUNK_SIZE = 20000
+# Показатель закона Ципфа для популярности авторов и групп.
+ZIPF_ALPHA = 1.1
+# Средний размер всплеска публикаций и интервал внутри него, секунд.
+BURST_SIZE = 20
+BURST_GAP = 120
+IMAGE_SIZE = (960, 540)
+# Конец окна публикаций по умолчанию. Дата фиксирована, а не «сейчас»:
+# иначе прогоны в разные дни дают разные данные.
+SEED_UNTIL = datetime(2022, 7, 1, tzinfo=timezone.utc)
+WORDS = (
+    'день', 'город', 'время', 'жизнь', 'дорога', 'книга', 'музыка',
+    'погода', 'работа', 'утро', 'вечер', 'друзья', 'море', 'горы',
+    'фотография', 'кофе', 'новости', 'проект', 'путешествие', 'кино',
+    'сегодня', 'вчера', 'снова', 'очень', 'новый', 'старый', 'большой',
+    'красивый', 'тихий', 'думаю', 'читаю', 'пишу', 'смотрю', 'гуляю',
+)
+
+SeedPlan = namedtuple('SeedPlan', (
+    'seed users groups posts comments follows_per_user '
+    'images image_ratio days until'
+))
+Bases = namedtuple('Bases', 'user group post')
+
+
+def _rng(plan, *scope):
+    return random.Random(':'.join(map(str, (plan.seed,) + scope)))
+
+
+def zipf_weights(count, alpha=ZIPF_ALPHA):
+    """Накопленные веса закона Ципфа для random.choices."""
+    return list(accumulate(1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def _chunks(total):
+    return [
+        (start, min(start + CHUNK_SIZE, total))
+        for start in range(0, total, CHUNK_SIZE)
+    ]
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(pk=Max('pk'))['pk'] or 0) + 1
+
+
+def _popular_users(plan, bases):
+    """Пользователи по убыванию популярности."""
+    user_ids = list(range(bases.user, bases.user + plan.users))
+    _rng(plan, 'popularity').shuffle(user_ids)
+    return user_ids
+
+
+@contextmanager
+def explicit_dates():
+    """Отключает auto_now_add, чтобы сохранить сгенерированные даты."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def create_images(plan, start, stop):
+    for number in range(start, stop):
+        rng = _rng(plan, 'image', number)
+        image = Image.new('RGB', IMAGE_SIZE, tuple(
+            rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+            draw.ellipse(
+                (x, y, x + rng.randint(20, 300), y + rng.randint(20, 300)),
+                fill=tuple(rng.randrange(256) for _ in range(3)),
+            )
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        name = image_name(number)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def image_name(number):
+    return f'posts/seed-{number}.jpg'
+
+
+def _burst_times(rng, start, span, count):
+    """Время публикаций: всплески в случайные моменты окна."""
+    end = start + timedelta(seconds=span)
+    times = []
+    while len(times) < count:
+        moment = start + timedelta(seconds=rng.uniform(0, span))
+        for _ in range(min(count - len(times),
+                           1 + int(rng.expovariate(1 / BURST_SIZE)))):
+            moment += timedelta(seconds=rng.expovariate(1 / BURST_GAP))
+            times.append(min(moment, end))
+    return sorted(times)
+
+
+def build_posts(plan, bases, start, stop):
+    rng = _rng(plan, 'posts', start)
+    authors = _popular_users(plan, bases)
+    author_weights = zipf_weights(len(authors))
+    groups = list(range(bases.group, bases.group + plan.groups)) + [None]
+    group_weights = zipf_weights(len(groups))
+    # Посты идут по времени: кусок занимает свою часть общего окна.
+    window = plan.days * 86400
+    began = plan.until - timedelta(days=plan.days)
+    times = _burst_times(
+        rng, began + timedelta(seconds=window * start / plan.posts),
+        window * (stop - start) / plan.posts, stop - start,
+    )
+    posts = []
+    for number, pub_date in zip(range(start, stop), times):
+        image = ''
+        if plan.images and rng.random() < plan.image_ratio:
+            image = image_name(rng.randrange(plan.images))
+        posts.append(Post(
+            pk=bases.post + number,
+            author_id=rng.choices(authors, cum_weights=author_weights)[0],
+            group_id=rng.choices(groups, cum_weights=group_weights)[0],
+            text=_text(rng, 5, 60),
+            image=image,
+            pub_date=pub_date,
+        ))
+    return posts
+
+
+def _pub_dates(post_ids):
+    dates = {}
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), LOOKUP_BATCH_SIZE):
+        dates.update(Post.objects.filter(
+            pk__in=post_ids[start:start + LOOKUP_BATCH_SIZE]
+        ).values_list('pk', 'pub_date'))
+    return dates
+
+
+def build_comments(plan, bases, start, stop):
+    rng = _rng(plan, 'comments', start)
+    user_ids = range(bases.user, bases.user + plan.users)
+    # Степень смещает выбор к части постов: обсуждают немногие.
+    post_ids = [
+        bases.post + int(plan.posts * rng.random() ** 3)
+        for _ in range(start, stop)
+    ]
+    dates = _pub_dates(set(post_ids))
+    return [
+        Comment(
+            post_id=post_id,
+            author_id=rng.choice(user_ids),
+            text=_text(rng, 2, 20),
+            created=dates[post_id] + timedelta(
+                seconds=rng.expovariate(1 / 3600)),
+        )
+        for post_id in post_ids
+    ]
+
+
+def build_follows(plan, bases, start, stop):
+    rng = _rng(plan, 'follows', start)
+    authors = _popular_users(plan, bases)
+    weights = zipf_weights(len(authors))
+    follows = []
+    for user_id in range(bases.user + start, bases.user + stop):
+        # Парето с alpha=2 имеет среднее 2: в среднем follows_per_user.
+        count = min(
+            plan.users - 1,
+            round(plan.follows_per_user * rng.paretovariate(2) / 2),
+        )
+        targets = set(rng.choices(authors, cum_weights=weights, k=count))
+        targets.discard(user_id)
+        follows.extend(
+            Follow(user_id=user_id, author_id=author_id)
+            for author_id in sorted(targets)
+        )
+    return follows
+
+
+def _run(tasks, workers, save=None):
+    """Выполняет задачи и сохраняет их результаты по порядку.
+
+    Процессы только генерируют строки, пишет в базу текущий процесс:
+    SQLite не допускает параллельных писателей. В работе держится
+    не больше двух задач на процесс, чтобы не копить куски в памяти.
+    """
+    save = save or (lambda result: None)
+    if not workers:
+        for function, *args in tasks:
+            save(function(*args))
+        return
+    # Дочерние процессы не должны наследовать открытые соединения.
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(*task))
+            if len(pending) >= workers * 2:
+                save(pending.popleft().result())
+        while pending:
+            save(pending.popleft().result())
+
+
+def _save_with_dates(model):
+    def save(objs):
+        with explicit_dates():
+            model.objects.bulk_create(objs)
+    return save
+
+
+def seed(plan, workers=0, log=print):
+    """Заполняет базу по плану и возвращает первые ключи созданных
+    пользователей, групп и постов."""
+    bases = Bases(_next_pk(User), _next_pk(Group), _next_pk(Post))
+    log(f'Пользователи: {plan.users}')
+    User.objects.bulk_create(
+        (User(pk=pk, username=f'seed-{pk}', password='!')
+         for pk in range(bases.user, bases.user + plan.users)),
+    )
+    log(f'Группы: {plan.groups}')
+    Group.objects.bulk_create(
+        (Group(pk=pk, title=f'Группа {pk}', slug=f'seed-group-{pk}',
+               description=_text(_rng(plan, 'group', pk), 5, 20))
+         for pk in range(bases.group, bases.group + plan.groups)),
+    )
+    log(f'Картинки: {plan.images}')
+    _run([(create_images, plan, start, stop)
+          for start, stop in _chunks(plan.images)], workers)
+    log(f'Посты: {plan.posts}')
+    _run([(build_posts, plan, bases, start, stop)
+          for start, stop in _chunks(plan.posts)],
+         workers, _save_with_dates(Post))
+    log(f'Комментарии: {plan.comments}')
+    _run([(build_comments, plan, bases, start, stop)
+          for start, stop in _chunks(plan.comments)],
+         workers, _save_with_dates(Comment))
+    log('Подписки')
+    _run([(build_follows, plan, bases, start, stop)
+          for start, stop in _chunks(plan.users)], workers,
+         lambda follows: Follow.objects.bulk_create(
+             follows, ignore_conflicts=True))
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Group, Post, Comment, Follow]):
+            cursor.execute(sql)
+    return bases
+
+
+TIMELINE_BACKFILL_SQL = '''
+INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+SELECT follow.user_id, post.id, post.author_id, post.pub_date
+FROM {follow} AS follow
+JOIN (
+    SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+        PARTITION BY author_id ORDER BY pub_date DESC
+    ) AS position
+    FROM {post}
+) AS post ON post.author_id = follow.author_id
+WHERE follow.user_id >= %s AND post.position <= %s
+AND follow.author_id NOT IN ({pull_authors})
+'''
+
+
+def backfill_timelines(bases):
+    """То же, что timeline.backfill для каждой подписки, одним запросом."""
+    pulled, params = pull_authors().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(TIMELINE_BACKFILL_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+            pull_authors=pulled,
+        ), [bases.user, BACKFILL_SIZE, *params])
+
+
+def rebuild_derived(bases, log=print):
+    """bulk_create не шлёт сигналы: ленты подписок и поисковый индекс
+    строятся отдельно. Счётчики должны быть уже пересчитаны, иначе
+    плодовитые авторы попадут в материализованные ленты."""
+    log('Ленты подписок')
+    backfill_timelines(bases)
+    log('Поисковый индекс')
+    rebuild_index()
@@ -0,0 +1,117 @@
+import threading
+from collections import Counter
+
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from .cache import (
+    GROUPS_FEED, bump_feed_versions, bump_post_feeds, following_feed,
+)
+from .models import Comment, Follow, Group, Post, User, UserCounters
+from .search import index_post, unindex_post
+from .timeline import backfill, fan_out, trim
+
+# Комментарии удаляемых постов, уже учтённые в счётчиках.
+_deleting = threading.local()
+
+
+def _deleting_comments():
+    if not hasattr(_deleting, 'comments'):
+        _deleting.comments = set()
+    return _deleting.comments
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw, **kwargs):
+    # Строка счётчиков нужна сразу: change() не создаёт её, и посты,
+    # написанные до первого чтения счётчиков, не были бы учтены.
+    if created and not raw:
+        UserCounters.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # group_id может быть отложенным полем - не загружаем его.
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    index_post(instance)
+    bump_post_feeds(instance, instance._loaded_group_id)
+    instance._loaded_group_id = instance.group_id
+    if created:
+        UserCounters.change(instance.author_id, 'posts', 1)
+        fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Комментарии удаляются каскадом: счётчики их авторов сдвигаются
+    # одним запросом на автора, а ленты сбросит сам пост. Порядок
+    # каскада не гарантирован, поэтому помечаются сами комментарии.
+    comments = Comment.objects.filter(post=instance).values_list(
+        'pk', 'author_id')
+    deleting, authors = _deleting_comments(), Counter()
+    for pk, author_id in comments:
+        deleting.add(pk)
+        authors[author_id] += 1
+    for author_id, count in authors.items():
+        UserCounters.change(author_id, 'comments', -count)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+    bump_post_feeds(instance)
+    UserCounters.change(instance.author_id, 'posts', -1)
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump_feed_versions(GROUPS_FEED)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.change(instance.author_id, 'followers', 1)
+        UserCounters.change(instance.user_id, 'following', 1)
+        backfill(instance.user_id, instance.author_id)
+        bump_feed_versions(following_feed(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserCounters.change(instance.author_id, 'followers', -1)
+    UserCounters.change(instance.user_id, 'following', -1)
+    trim(instance.user_id, instance.author_id)
+    bump_feed_versions(following_feed(instance.user_id))
+
+
+def bump_comment_feeds(comment):
+    # Число комментариев выводится в лентах.
+    post = Post.objects.filter(pk=comment.post_id).only(
+        'author', 'group'
+    ).first()
+    if post is not None:
+        bump_post_feeds(post)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.change(instance.author_id, 'comments', 1)
+        bump_comment_feeds(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    deleting = _deleting_comments()
+    if instance.pk in deleting:
+        deleting.discard(instance.pk)
+        return
+    UserCounters.change(instance.author_id, 'comments', -1)
+    bump_comment_feeds(instance)
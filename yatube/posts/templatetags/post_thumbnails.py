@@ -0,0 +1,16 @@
+from django import template
+
+from posts.thumbnails import prefetch_thumbnails, thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, size='feed'):
+    return thumbnail(image, size)
+
+
+@register.simple_tag
+def prefetch_post_thumbnails(posts, size='feed'):
+    prefetch_thumbnails((post.image for post in posts), size)
+    return ''
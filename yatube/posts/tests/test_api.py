@@ -0,0 +1,227 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserCounters,
+)
+from ..search import search_posts
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group if number % 2 else None,
+                 text=f'Пост {number}')
+            for number in range(15)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Коммент {number}')
+            for number in range(3)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_posts_cursor_pages(self):
+        """Лента листается курсором без повторов, запросов - один
+        на страницу."""
+        url = reverse('api:posts-list')
+        with self.assertNumQueries(1):
+            first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), Post.objects.count())
+        self.assertEqual(first['results'][0]['author'], 'author')
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse('api:posts-list'), {'fields': 'id,text'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'text'})
+
+    def test_group_and_author_feeds(self):
+        url = reverse('api:posts-list')
+        group = self.client.get(url, {'group': 'test-slug', 'limit': 100})
+        self.assertEqual(len(group.json()['results']), 7)
+        self.assertEqual(
+            {item['group'] for item in group.json()['results']},
+            {'test-slug'})
+        author = self.client.get(url, {'author': 'reader'})
+        self.assertEqual(author.json()['results'], [])
+        missing = self.client.get(url, {'group': 'missing'})
+        self.assertEqual(missing.status_code, 404)
+
+    def test_etag(self):
+        """Неизменившийся ответ отдаётся как 304, правка поста
+        сбрасывает ETag."""
+        urls = (
+            reverse('api:posts-list'),
+            reverse('api:posts-detail', kwargs={'pk': self.post.pk}),
+            reverse('api:comments-list', kwargs={'post_id': self.post.pk}),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 304)
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_comments(self):
+        response = self.client.get(
+            reverse('api:comments-list', kwargs={'post_id': self.post.pk}))
+        results = response.json()['results']
+        self.assertEqual(
+            [item['text'] for item in results],
+            ['Коммент 2', 'Коммент 1', 'Коммент 0'])
+        missing = self.client.get(
+            reverse('api:comments-list', kwargs={'post_id': 0}))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_follow_requires_login(self):
+        url = reverse('api:follow-list')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': Follow.objects.get().pk, 'user': 'reader',
+              'author': 'author'}])
+        self.assertEqual(
+            self.client.get(url, {'fields': 'author'}).json()['results'],
+            [{'author': 'author'}])
+
+
+class BatchApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        UserCounters.for_user(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def post_batch(self, url, items):
+        return self.client.post(
+            reverse(url), items, content_type='application/json')
+
+    def test_posts_batch(self):
+        """Пачка постов сохраняется с индексом, счётчиками и лентами
+        подписчиков; ошибки формы возвращаются по объекту."""
+        index = self.client.get(reverse('posts:index'))
+        response = self.post_batch('api:posts-batch', [
+            {'text': 'Первый пакетный', 'group': self.group.pk},
+            {'text': ''},
+            {'text': 'Второй пакетный'},
+            'не объект',
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual(response.json()['created'], 2)
+        self.assertIn('text', results[1]['errors'])
+        self.assertIn('__all__', results[3]['errors'])
+        first = Post.objects.get(pk=results[0]['id'])
+        self.assertEqual(
+            (first.text, first.author, first.group),
+            ('Первый пакетный', self.author, self.group))
+        self.assertEqual(
+            Post.objects.get(pk=results[2]['id']).text, 'Второй пакетный')
+        self.assertEqual(UserCounters.for_user(self.author).posts, 2)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 2)
+        self.assertEqual(
+            {post.pk for post in search_posts('пакетный')[:10]},
+            {results[0]['id'], results[2]['id']})
+        repeated = self.client.get(
+            reverse('posts:index'), HTTP_IF_NONE_MATCH=index['ETag'])
+        self.assertContains(repeated, 'Второй пакетный')
+
+    def test_posts_batch_query_count(self):
+        """Число запросов не растёт с размером пачки."""
+        counts = []
+        for size in (2, 50):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_batch('api:posts-batch', [
+                    {'text': f'Пост {number}'} for number in range(size)
+                ])
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_posts_batch_groups_loaded_once(self):
+        """Группы пачки загружаются одним запросом, а не по посту."""
+        other = Group.objects.create(title='Другая', slug='other')
+        items = [
+            {'text': f'Пост {number}',
+             'group': (self.group.pk, other.pk)[number % 2]}
+            for number in range(6)
+        ]
+        # Сессия, пользователь, группы и 8 запросов create_posts.
+        with self.assertNumQueries(11):
+            response = self.post_batch('api:posts-batch', items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            Post.objects.filter(group=other).count(), 3)
+        response = self.post_batch(
+            'api:posts-batch', [{'text': 'x', 'group': 0}])
+        self.assertEqual(
+            response.json()['results'][0]['errors']['group'][0]['code'],
+            'invalid_choice')
+
+    def test_comments_batch(self):
+        post = Post.objects.create(author=self.reader, text='Пост')
+        response = self.post_batch('api:comments-batch', [
+            {'post': post.pk, 'text': 'Первый'},
+            {'post': post.pk, 'text': 'Второй'},
+            {'post': 0, 'text': 'Без поста'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.json()['results']
+        self.assertEqual(
+            list(post.comments.order_by('pk').values_list('pk', 'text')),
+            [(results[0]['id'], 'Первый'), (results[1]['id'], 'Второй')])
+        self.assertIn('__all__', results[2]['errors'])
+        self.assertEqual(UserCounters.for_user(self.author).comments, 2)
+
+    def test_batch_requires_login_and_list(self):
+        self.assertEqual(
+            self.post_batch('api:posts-batch', {'text': 'x'}).status_code,
+            400)
+        self.client.logout()
+        self.assertEqual(
+            self.post_batch('api:posts-batch', [{'text': 'x'}]).status_code,
+            403)
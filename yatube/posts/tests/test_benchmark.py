@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from .. import benchmark
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_run_reports_every_view(self):
+        """Прогон возвращает перцентили, запросы и память по страницам."""
+        dataset = benchmark.seed_dataset(
+            users=5, groups=2, posts=30, comments=20, follows=10, images=1
+        )
+        results = benchmark.run(dataset, requests=3, warmup=1)
+        self.assertEqual(set(results), {
+            scenario.name for scenario in benchmark.scenarios(dataset)
+        })
+        for name, result in results.items():
+            with self.subTest(name=name):
+                self.assertIn(result['status'], (200, 302))
+                self.assertLessEqual(result['p50'], result['p99'])
+                self.assertGreater(result['queries'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+
+    def test_compare_flags_regressions(self):
+        """Регрессией считается рост p95 сверх допуска и рост запросов."""
+        baseline = {'posts:index': {'p95': 10.0, 'queries': 3}}
+        self.assertEqual(benchmark.compare(
+            {'posts:index': {'p95': 11.0, 'queries': 3}}, baseline), [])
+        regressions = benchmark.compare(
+            {'posts:index': {'p95': 13.0, 'queries': 4}}, baseline)
+        self.assertEqual(len(regressions), 2)
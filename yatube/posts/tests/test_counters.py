@@ -0,0 +1,103 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserCounters
+
+User = get_user_model()
+
+
+class UserCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def counters(self, user):
+        return UserCounters.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        UserCounters.for_user(self.author)
+        UserCounters.for_user(self.reader)
+        post = Post.objects.create(text='Тестовый пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        self.assertEqual(self.counters(self.author).posts, 1)
+        self.assertEqual(self.counters(self.author).followers, 1)
+        self.assertEqual(self.counters(self.reader).following, 1)
+        self.assertEqual(self.counters(self.reader).comments, 1)
+
+        follow.delete()
+        post.delete()
+        self.assertEqual(self.counters(self.author).posts, 0)
+        self.assertEqual(self.counters(self.author).followers, 0)
+        self.assertEqual(self.counters(self.reader).following, 0)
+        self.assertEqual(self.counters(self.reader).comments, 0)
+
+    def test_post_delete_recounts_comments_in_bulk(self):
+        """Каскадное удаление комментариев сдвигает счётчики одним
+        запросом на автора: число запросов не зависит от комментариев."""
+        UserCounters.for_user(self.author)
+        UserCounters.for_user(self.reader)
+        counts = []
+        for size in (2, 20):
+            post = Post.objects.create(text='Пост', author=self.author)
+            Comment.objects.bulk_create(
+                Comment(post=post, author=(self.author, self.reader)[
+                    number % 2], text='Ок')
+                for number in range(size)
+            )
+            UserCounters.objects.update(comments=size // 2)
+            with CaptureQueriesContext(connection) as queries:
+                post.delete()
+            counts.append(len(queries))
+            self.assertEqual(self.counters(self.author).comments, 0)
+            self.assertEqual(self.counters(self.reader).comments, 0)
+        self.assertEqual(counts[0], counts[1])
+
+    def test_counters_created_with_user(self):
+        """Строка счётчиков создаётся вместе с пользователем, и первый
+        пост учитывается без чтения счётчиков."""
+        user = User.objects.create_user(username='newcomer')
+        Post.objects.create(text='Первый пост', author=user)
+        self.assertEqual(self.counters(user).posts, 1)
+
+    def test_post_create_is_atomic(self):
+        """Сбой в сигналах откатывает и пост, и счётчики."""
+        self.client.force_login(self.author)
+        with mock.patch('posts.signals.fan_out',
+                        side_effect=DatabaseError('сбой раскладки')), \
+                self.assertRaises(DatabaseError):
+            self.client.post(
+                reverse('posts:post_create'), {'text': 'Не сохранится'})
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(self.counters(self.author).posts, 0)
+
+    def test_for_user_initializes_from_data(self):
+        """Счётчики без строки в базе считаются по данным."""
+        Post.objects.create(text='Тестовый пост', author=self.author)
+        UserCounters.objects.filter(user=self.author).delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(UserCounters.for_user(self.author).posts, 1)
+        # Подсчёт идёт вне транзакции: в ней только INSERT.
+        sql = [query['sql'].split()[0] for query in queries]
+        start = sql.index('SAVEPOINT')
+        self.assertEqual(sql[start:], ['SAVEPOINT', 'INSERT', 'RELEASE'])
+
+    def test_rebuild_counters_fixes_drift(self):
+        """Команда rebuild_counters находит и исправляет расхождения."""
+        Post.objects.create(text='Тестовый пост', author=self.author)
+        UserCounters.for_user(self.author)
+        UserCounters.objects.filter(user=self.author).update(posts=5)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn(f'user_id={self.author.pk}: posts +4', out.getvalue())
+        self.assertEqual(self.counters(self.author).posts, 1)
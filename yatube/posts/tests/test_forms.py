@@ -4,10 +4,15 @@ from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
+from django.core.management import call_command
+from io import StringIO
 from rest_framework import status
 import shutil
 import tempfile
 from ..models import Group, Post
+from sorl.thumbnail import default
+from ..thumbnails import (generate_thumbnails, prefetch_thumbnails,
+                          thumbnail)
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -149,3 +154,56 @@ class PostCreateFormTests(TestCase):
             follow=True
         )
         self.assertEqual(self.post.comments.count(), comments + 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='NoName')
+        cls.post = Post.objects.create(
+            text='Тестовый текст',
+            author=cls.author,
+            image=SimpleUploadedFile(
+                name='thumb.gif',
+                content=(
+                    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+                    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                    b'\x0A\x00\x3B'
+                ),
+                content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_thumbnails(self):
+        """Миниатюры всех именованных размеров создаются заранее."""
+        generate_thumbnails(self.post.image.name)
+        for size in settings.POST_THUMBNAIL_SIZES:
+            with self.subTest(size=size):
+                image = thumbnail(self.post.image, size)
+                self.assertTrue(image.exists())
+
+    def test_regenerate_thumbnails_command(self):
+        """Команда regenerate_thumbnails обрабатывает media/posts/."""
+        out = StringIO()
+        call_command('regenerate_thumbnails', workers=1, stdout=out)
+        self.assertIn('Обработано картинок: 1 из 1', out.getvalue())
+
+    def test_kvstore_prefetch(self):
+        """Метаданные миниатюр страницы загружаются одним запросом."""
+        default.kvstore.lru.clear()
+        generate_thumbnails(self.post.image.name)
+        default.kvstore.lru.clear()
+        with self.assertNumQueries(1):
+            prefetch_thumbnails([self.post.image, self.post.image])
+        with self.assertNumQueries(0):
+            self.assertTrue(thumbnail(self.post.image, 'feed').exists())
@@ -0,0 +1,133 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.paginator import encode_cursor
+from ..models import Comment, Follow, Group, Post, UserCounters
+from ..timeline import PULL_AUTHOR_MIN_POSTS
+
+User = get_user_model()
+
+AUTHORS = 5
+POSTS_PER_AUTHOR = 30
+COMMENTS_PER_POST = 2
+
+# Полный проход по таблице: SCAN без индекса или по индексу целиком.
+FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+POST_SCAN_RE = re.compile(r'^SCAN (TABLE )?posts_post\b')
+TEMP_SORT = 'USE TEMP B-TREE'
+# Выборка постов по списку первичных ключей: сортируется не больше
+# строк, чем в списке.
+PK_LOOKUP = 'USING INTEGER PRIMARY KEY (rowid=?)'
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTests(TestCase):
+    """Запросы лент не сканируют таблицы целиком и не сортируют
+    во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plan-group', description='Описание'
+        )
+        authors = [
+            User.objects.create_user(username=f'author-{number}')
+            for number in range(AUTHORS)
+        ]
+        Post.objects.bulk_create(
+            Post(author=author, group=cls.group if number % 2 else None,
+                 text=f'Пост {number}')
+            for author in authors
+            for number in range(POSTS_PER_AUTHOR)
+        )
+        cls.author = authors[0]
+        cls.post = Post.objects.filter(author=cls.author).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.reader, text='Комментарий')
+            for post in Post.objects.all()
+            for _ in range(COMMENTS_PER_POST)
+        )
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        # Читатель одного тихого автора и одного плодовитого (pull).
+        cls.quiet_reader = User.objects.create_user(username='quiet')
+        Follow.objects.create(user=cls.quiet_reader, author=authors[1])
+        UserCounters.for_user(authors[2])
+        UserCounters.objects.filter(user=authors[2]).update(
+            posts=PULL_AUTHOR_MIN_POSTS)
+        Follow.objects.create(user=cls.quiet_reader, author=authors[2])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def assertIndexedPlans(self, url, forbid_post_scan=False):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = query_plan(sql)
+            bounded = any(PK_LOOKUP in step for step in plan)
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN_RE.match(step))
+                    if forbid_post_scan:
+                        self.assertIsNone(POST_SCAN_RE.match(step))
+                    if not bounded:
+                        self.assertNotIn(TEMP_SORT, step)
+
+    def test_feed_plans(self):
+        cursor = encode_cursor(self.post)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + f'?after={cursor}',
+            reverse('posts:index') + f'?before={cursor}',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+            + f'?after={cursor}',
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:profile', kwargs={'username': self.author})
+            + f'?after={cursor}',
+        )
+        for url in urls:
+            self.assertIndexedPlans(url)
+
+    def test_follow_feed_plans(self):
+        """Лента подписок идёт от записей ленты читателя, а не от всей
+        таблицы постов: ни одного SCAN posts_post."""
+        cursor = encode_cursor(self.post)
+        urls = (
+            reverse('posts:follow_index'),
+            reverse('posts:follow_index') + f'?after={cursor}',
+            reverse('posts:follow_index') + f'?before={cursor}',
+        )
+        for reader in (self.reader, self.quiet_reader):
+            self.client.force_login(reader)
+            for url in urls:
+                self.assertIndexedPlans(url, forbid_post_scan=True)
+
+    def test_post_detail_plans(self):
+        comment = self.post.comments.first()
+        cursor = encode_cursor(comment, 'created')
+        urls = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:comments', kwargs={'post_id': self.post.pk})
+            + f'?after={cursor}',
+        )
+        for url in urls:
+            self.assertIndexedPlans(url)
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Post
+from ..search import TokenIndexBackend, search_posts, tokenize
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.auth = User.objects.create_user(username='auth')
+        cls.post_cats = Post.objects.create(
+            text='Ночные прогулки с котами по крышам',
+            author=cls.auth,
+        )
+        cls.post_dogs = Post.objects.create(
+            text='Собака и кот: история дружбы. Кот, кот и ещё раз кот.',
+            author=cls.auth,
+        )
+        cls.post_other = Post.objects.create(
+            text='Рецепт ёлочных пряников',
+            author=cls.auth,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tokenize_russian_word_forms(self):
+        """Словоформы одного слова приводятся к общей основе."""
+        self.assertEqual(tokenize('Прогулки'), tokenize('прогулка'))
+        self.assertEqual(tokenize('ёлочных'), tokenize('елочные'))
+
+    def test_search_ranks_and_matches_forms(self):
+        """Поиск находит словоформы и ранжирует по релевантности."""
+        results = search_posts('кот')
+        self.assertEqual(
+            list(results[:len(results)]),
+            [self.post_dogs, self.post_cats]
+        )
+
+    def test_search_prefix(self):
+        """Поиск находит слова по префиксу."""
+        self.assertEqual(list(search_posts('пряни')[:10]), [self.post_other])
+
+    def test_index_is_kept_in_sync(self):
+        """Индекс обновляется при изменении и удалении постов."""
+        post = Post.objects.create(text='Рецепт пирога', author=self.auth)
+        post.text = 'Рецепт имбирного печенья'
+        post.save()
+        self.assertEqual(len(search_posts('пирог')), 0)
+        self.assertEqual(len(search_posts('печенье')), 1)
+        post.delete()
+        self.assertEqual(len(search_posts('печенье')), 0)
+
+    def test_fallback_backend(self):
+        """Индекс в памяти даёт тот же результат, что и FTS5."""
+        backend = TokenIndexBackend()
+        backend.rebuild(Post.objects.values_list('id', 'text'))
+        self.assertEqual(
+            backend.search(tokenize('кот')),
+            [self.post_dogs.id, self.post_cats.id]
+        )
+        backend.remove(self.post_dogs.id)
+        self.assertEqual(backend.search(tokenize('кот')), [self.post_cats.id])
+
+    def test_index_page_search(self):
+        """Страница index выводит найденные посты."""
+        response = self.client.get(reverse('posts:index') + '?search=крыши')
+        self.assertEqual(
+            list(response.context['page_obj']), [self.post_cats]
+        )
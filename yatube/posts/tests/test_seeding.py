@@ -0,0 +1,69 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from .. import seeding
+from ..models import Comment, Follow, Post, TimelineEntry
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+PLAN = seeding.SeedPlan(
+    seed=7, users=30, groups=3, posts=200, comments=100,
+    follows_per_user=4, images=2, image_ratio=0.5, days=10,
+    until=seeding.SEED_UNTIL,
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_chunks_are_deterministic(self):
+        """Кусок данных зависит только от seed и своего номера."""
+        bases = seeding.Bases(1, 1, 1)
+        first = seeding.build_posts(PLAN, bases, 0, 50)
+        second = seeding.build_posts(PLAN, bases, 0, 50)
+        self.assertEqual(
+            [(post.pk, post.author_id, post.text, post.pub_date)
+             for post in first],
+            [(post.pk, post.author_id, post.text, post.pub_date)
+             for post in second],
+        )
+        other = seeding.build_posts(PLAN._replace(seed=8), bases, 0, 50)
+        self.assertNotEqual(
+            [post.text for post in first], [post.text for post in other]
+        )
+
+    def test_seed_fills_database(self):
+        """Данные создаются в окне дат, без подписок на себя,
+        с лентами подписок и файлами картинок."""
+        bases = seeding.seed(PLAN, log=lambda message: None)
+        seeding.rebuild_derived(bases, log=lambda message: None)
+        self.assertEqual(
+            Post.objects.filter(pk__gte=bases.post).count(), PLAN.posts)
+        self.assertEqual(Comment.objects.count(), PLAN.comments)
+        posts = Post.objects.filter(pk__gte=bases.post)
+        window_start = PLAN.until - timedelta(days=PLAN.days)
+        self.assertFalse(posts.filter(pub_date__lt=window_start).exists())
+        self.assertFalse(posts.filter(pub_date__gt=PLAN.until).exists())
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(
+            user_id=F('author_id')).exists())
+        self.assertEqual(
+            TimelineEntry.objects.count(),
+            sum(
+                min(Post.objects.filter(author_id=author).count(),
+                    seeding.BACKFILL_SIZE)
+                for author in Follow.objects.values_list(
+                    'author_id', flat=True)
+            ),
+        )
+        self.assertTrue(default_storage.exists(seeding.image_name(1)))
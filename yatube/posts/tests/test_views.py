@@ -1,10 +1,19 @@
+import re
+
 from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.test import TestCase, Client
+from core.paginator import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from core.streaming import stream_template
+from django.template.loader import get_template
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django import forms
 
-from ..models import Follow, Group, Post
+from ..forms import CommentForm
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, UserCounters,
+)
+from ..timeline import PULL_AUTHOR_MIN_POSTS
 
 User = get_user_model()
 
@@ -240,19 +249,66 @@ class PaginatorViewsTest(TestCase):
             + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_pages_cover_feed(self):
+        """Проверка: курсорная пагинация проходит ленту без пропусков."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}))
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+            + f'?after={first_page.next_cursor}')
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        ids = [post.id for post in first_page] + [
+            post.id for post in second_page]
+        self.assertEqual(len(set(ids)), 13)
+
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+            + f'?before={second_page.previous_cursor}')
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [post.id for post in first_page])
+
+    def test_broken_cursor_shows_first_page(self):
+        """Проверка: испорченный курсор открывает первую страницу."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'})
+            + '?after=broken')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
+        """Проверка хранения кэша index и его сброса новой записью."""
+        cache.clear()
         response_before = self.authorized_client.get(reverse('posts:index'))
+        # Изменение в обход сигналов не сбрасывает версию ленты.
+        Post.objects.filter(pk=self.post_13.pk).update(text='изменён')
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response_before.content, response_cached.content)
+
         Post.objects.create(
             text='test_new_post',
             author=self.auth,
         )
         response_after = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response_before.content, response_after.content)
+        self.assertNotEqual(response_before.content, response_after.content)
+        self.assertContains(response_after, 'test_new_post')
 
+    def test_cache_varies_by_page_and_search(self):
+        """Кэш index различает страницы и поисковые запросы."""
         cache.clear()
-        response = self.authorized_client.get(reverse('posts:index'))
-        self.assertNotEqual(response_before.content, response.content)
+        first = self.client.get(reverse('posts:index'))
+        second = self.client.get(
+            reverse('posts:index')
+            + f'?after={first.context["page_obj"].next_cursor}')
+        self.assertEqual(second.content.count(b'<article>'), 3)
+        search = self.client.get(reverse('posts:index') + '?search=нет')
+        self.assertNotContains(search, '<article>')
 
     def test_auth_follow(self):
         """ Авторизованный пользователь может подписываться на других
@@ -291,3 +347,381 @@ class PaginatorViewsTest(TestCase):
         self.authorized_client.login(username='user_temp', password='pass')
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_backfill_and_trim(self):
+        """Подписка дополняет ленту старыми постами, отписка очищает её."""
+        old_post = Post.objects.create(author=self.author, text='Старый')
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=old_post).exists())
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.feed(), [new_post, old_post])
+
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow',
+                    kwargs={'username': 'author'}),
+            HTTP_REFERER='/')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_prolific_author_is_pulled(self):
+        """Посты плодовитых авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.for_user(self.author)
+        UserCounters.objects.filter(user=self.author).update(
+            posts=PULL_AUTHOR_MIN_POSTS)
+        post = Post.objects.create(author=self.author, text='Много постов')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed(), [post])
+
+    def follow_pages(self):
+        url = reverse('posts:follow_index')
+        pages, query = [], {}
+        while True:
+            page = self.authorized_client.get(url, query).context['page_obj']
+            pages.append(list(page))
+            if not page.next_cursor:
+                return pages
+            query = {'after': page.next_cursor}
+
+    def test_author_enters_pull_mode(self):
+        """Записи ленты автора, ставшего плодовитым, не дублируют его
+        подмешанные посты: страницы полные, лента без потерь."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.for_user(self.author)
+        for number in range(POSTS_PER_PAGE + 5):
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+        UserCounters.objects.filter(user=self.author).update(
+            posts=PULL_AUTHOR_MIN_POSTS)
+        pages = self.follow_pages()
+        self.assertEqual(len(pages[0]), POSTS_PER_PAGE)
+        self.assertEqual(
+            sum(pages, []), list(Post.objects.order_by('-pub_date', '-pk')))
+
+    def test_author_leaves_pull_mode(self):
+        """Посты, написанные в режиме подмешивания, остаются в ленте,
+        когда постов автора становится меньше порога."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.for_user(self.author)
+        UserCounters.objects.filter(user=self.author).update(
+            posts=PULL_AUTHOR_MIN_POSTS)
+        posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+        UserCounters.objects.filter(user=self.author).update(posts=3)
+        self.assertEqual(self.follow_pages(), [posts[::-1]])
+
+    def test_cursor_pages_merge_pulled_author(self):
+        """Курсоры листают слитую ленту без пропусков и повторов."""
+        quiet = User.objects.create_user(username='quiet')
+        Follow.objects.create(user=self.reader, author=quiet)
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserCounters.for_user(self.author)
+        UserCounters.objects.filter(user=self.author).update(
+            posts=PULL_AUTHOR_MIN_POSTS)
+        for number in range(POSTS_PER_PAGE + 5):
+            Post.objects.create(author=self.author, text=f'Pull {number}')
+            Post.objects.create(author=quiet, text=f'Тихий {number}')
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+        url = reverse('posts:follow_index')
+        pages, query = [], {}
+        while True:
+            page = self.authorized_client.get(url, query).context['page_obj']
+            pages.append(list(page))
+            if not page.next_cursor:
+                break
+            query = {'after': page.next_cursor}
+        self.assertEqual(sum(pages, []), expected)
+        back = self.authorized_client.get(
+            url, {'before': page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), pages[-2])
+
+
+class FeedQueryBudgetTests(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(10):
+            group = Group.objects.create(
+                title=f'Группа {number}',
+                slug=f'group-{number}',
+                description='Тестовое описание',
+            )
+            author = User.objects.create_user(username=f'user-{number}')
+            Post.objects.create(author=author, group=group, text='Пост')
+            Post.objects.create(author=cls.author, group=group, text='Пост')
+        UserCounters.for_user(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_feed_query_budget(self):
+        """Ленты укладываются в фиксированный бюджет запросов."""
+        budgets = {
+            reverse('posts:index'): 1,
+            reverse('posts:group_list', kwargs={'slug': 'group-0'}): 2,
+            reverse('posts:profile', kwargs={'username': 'author'}): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.client.get(url)
+        # Сессия и пользователь, подмешанные авторы, кандидаты из
+        # записей ленты и страница постов по их ключам.
+        with self.assertNumQueries(5):
+            self.authorized_client.get(reverse('posts:follow_index'))
+
+    def test_cached_fragment_skips_page_query(self):
+        """При попадании в кэш фрагмента страница постов не читается."""
+        first = self.client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].next_cursor
+        budgets = {
+            reverse('posts:index'): 0,
+            reverse('posts:index') + f'?after={cursor}': 0,
+            reverse('posts:index') + f'?before={cursor}': 0,
+            reverse('posts:group_list', kwargs={'slug': 'group-0'}): 1,
+            reverse('posts:profile', kwargs={'username': 'author'}): 2,
+        }
+        for url, budget in budgets.items():
+            self.client.get(url)
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.client.get(url)
+
+    def test_feed_comment_count(self):
+        """Посты ленты аннотированы числом комментариев."""
+        post = Post.objects.filter(author=self.author).first()
+        post.comments.create(author=self.reader, text='Комментарий')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+        counts = {
+            item.pk: item.comment_count
+            for item in response.context['page_obj']
+        }
+        self.assertEqual(counts[post.pk], 1)
+        self.assertEqual(sum(counts.values()), 1)
+
+
+class ConditionalGetTests(TestCase):
+    """Неизменившиеся страницы отдаются ответом 304."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag или Last-Modified получает 304
+        без запросов страницы."""
+        for url in self.urls:
+            response = self.client.get(url)
+            # Кроме index, страница сначала находит группу, автора
+            # или пост.
+            queries = 0 if url == self.urls[0] else 1
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                repeated = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(repeated.status_code, 304)
+            with self.subTest(url=url):
+                repeated = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(repeated.status_code, 304)
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_changes_reset_validators(self):
+        """Правка поста и комментарий меняют ETag всех страниц."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+                etags[url] = response['ETag']
+        self.post.comments.create(author=self.reader, text='Комментарий')
+        for url in self.urls[2:]:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+
+    def test_validators_vary_by_user(self):
+        """ETag зависит от пользователя и от его подписок."""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        guest = self.client.get(url)['ETag']
+        reader = self.authorized_client.get(url)['ETag']
+        self.assertNotEqual(guest, reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=reader)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['following'])
+
+    def test_pages_have_own_validators(self):
+        """Разные страницы одной ленты имеют разные ETag."""
+        url = reverse('posts:index')
+        first = self.client.get(url)['ETag']
+        self.assertNotEqual(
+            first, self.client.get(url + '?search=пост')['ETag'])
+
+
+class CommentPaginationTests(TestCase):
+    """Комментарии поста выводятся от старых к новым пачками
+    по курсору."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=User.objects.create_user(
+                username=f'user-{number}'), text=f'Комментарий {number}')
+            for number in range(COMMENTS_PER_PAGE + 5)
+        )
+
+    def test_detail_shows_first_batch(self):
+        """Страница поста выводит первую пачку и ссылку на следующую."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(
+            list(comments),
+            list(Comment.objects.order_by('pk')[:COMMENTS_PER_PAGE]))
+        self.assertContains(response, f'?after={comments.next_cursor}')
+
+    def test_fragment_continues_batch(self):
+        """Фрагмент и JSON отдают следующую пачку без повторов."""
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(first['comments']), COMMENTS_PER_PAGE)
+        # Авторы загружаются тем же запросом, что и комментарии.
+        with self.assertNumQueries(2):
+            second = self.client.get(
+                url, {'format': 'json', 'after': first['next_cursor']}
+            ).json()
+        self.assertIsNone(second['next_cursor'])
+        ids = [item['id'] for item in first['comments'] + second['comments']]
+        self.assertEqual(sorted(ids), ids)
+        self.assertEqual(len(set(ids)), Comment.objects.count())
+
+        fragment = self.client.get(url, {'after': first['next_cursor']})
+        self.assertTemplateUsed(fragment, 'includes/comments.html')
+        self.assertEqual(fragment.content.count(b'class="media mb-4"'), 5)
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class StreamingPagesTests(TestCase):
+    """Потоковый рендер выдаёт ту же страницу, что и render()."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author,
+                    text=f'Комментарий {number}')
+            for number in range(COMMENTS_PER_PAGE + 5)
+        )
+        Follow.objects.create(
+            user=User.objects.create_user(username='reader'),
+            author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='reader'))
+
+    def page(self, url, streaming):
+        cache.clear()
+        with override_settings(STREAMING_PAGES=streaming):
+            response = self.client.get(url)
+        self.assertEqual(response.streaming, streaming)
+        content = (b''.join(response.streaming_content) if streaming
+                   else response.content).decode()
+        return response, re.sub(r'value="\w{64}"', '', content)
+
+    def test_same_content(self):
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                _, expected = self.page(url, streaming=False)
+                response, streamed = self.page(url, streaming=True)
+                self.assertEqual(streamed, expected)
+                self.assertTrue(response.has_header('ETag')
+                                or url == reverse('posts:follow_index'))
+
+    def test_head_flushed_first(self):
+        """Первая часть - <head> и шапка, дальше комментарии частями."""
+        request = self.client.get(reverse('posts:index')).wsgi_request
+        context = {
+            'post': self.post,
+            'form_comment': CommentForm(),
+            'comments': self.post.comments.all(),
+        }
+        chunks = list(stream_template(
+            get_template('posts/post_detail.html').template,
+            context, request, size=1024))
+        # Шапка отправлена отдельно, до текста поста и комментариев.
+        header = next(
+            number for number, chunk in enumerate(chunks)
+            if chunk.rstrip().endswith('</header>'))
+        self.assertNotIn('Комментарий', ''.join(chunks[:header + 1]))
+        self.assertGreater(len(chunks), header + 2)
+        # Токен создан до ответа: cookie выставлена middleware.
+        with override_settings(STREAMING_PAGES=True):
+            response = self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertIn('csrftoken', response.cookies)
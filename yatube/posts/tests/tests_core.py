@@ -1,9 +1,548 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.template import engines
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
+from core import metrics
+from core.cache import STATS_FLUSH_PENDING, SQLiteCache
+from core.duplicates import DuplicateQueryWarning, fingerprint
+from core.mail import LEASE, MAX_ATTEMPTS, retry_delay, send_queued
+from core.middleware import CompressionMiddleware, StaticAssetsMiddleware
+from core.models import OutboxMessage
+from core.sqlite.base import DatabaseWrapper
+from posts.models import Post
+from core.warmup import compile_templates, warm_up_on_start
+
+User = get_user_model()
+
 
 class ViewTestClass(TestCase):
     def test_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 5},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_and_shared_file(self):
+        """Записи видны другому экземпляру с тем же файлом."""
+        self.cache.set('key', {'value': [1, 2]})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get('key'), {'value': [1, 2]})
+        self.assertTrue(other.add('new', 1))
+        self.assertFalse(other.add('new', 2))
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiry(self):
+        """Просроченная запись не возвращается."""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertFalse(self.cache.has_key('key'))
+
+    def test_incr(self):
+        """incr увеличивает счётчик, для отсутствующего ключа - ошибка."""
+        self.cache.set('version', 1, None)
+        self.assertEqual(self.cache.incr('version'), 2)
+        self.assertEqual(self.cache.decr('version', 2), 0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction_and_stats(self):
+        """При превышении размера вытесняются давно не читавшиеся."""
+        for number in range(5):
+            self.cache.set(f'key-{number}', number)
+        self.cache._connection().execute(
+            "UPDATE cache_entries SET accessed = 0 WHERE key LIKE '%key-0'"
+        )
+        self.cache.set('key-5', 5)
+        self.assertIsNone(self.cache.get('key-0'))
+        self.assertEqual(self.cache.get('key-5'), 5)
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 5)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_stats_flushed_after_pending_threshold(self):
+        """Накопив STATS_FLUSH_PENDING операций, счётчики пишутся в файл."""
+        self.cache.get('key')
+        other = SQLiteCache(self.location, {})
+        counts = dict(other._connection().execute(
+            'SELECT name, value FROM cache_stats'))
+        self.assertEqual(counts['misses'], 0)
+        self.cache.get_many(
+            [f'key-{number}' for number in range(STATS_FLUSH_PENDING)])
+        counts = dict(other._connection().execute(
+            'SELECT name, value FROM cache_stats'))
+        self.assertEqual(counts['misses'], STATS_FLUSH_PENDING + 1)
+
+    def test_stats_flushed_at_exit(self):
+        """Счётчики короткого процесса пишутся при его завершении."""
+        self.cache.clear()
+        code = (
+            'from core.cache import SQLiteCache\n'
+            f'cache = SQLiteCache({self.location!r}, {{}})\n'
+            'cache.get("key")\n'
+            'cache.close()\n'
+        )
+        subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, check=True)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_cache_stats_command(self):
+        """Команда cache_stats выводит счётчики кэша."""
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('default: попаданий', out.getvalue())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время SQL, шаблонов и общее время."""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_metrics_endpoint_for_staff_only(self):
+        """Сводка по именам URL доступна только персоналу."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        url = reverse('core:request_metrics')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(url).json()
+        index = data['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertGreater(index['size_avg'], 0)
+        self.assertGreater(index['template_ms_avg'], 0)
+        self.assertEqual(sum(index['histogram_ms'].values()), 2)
+
+    def test_streamed_metrics_match_buffered(self):
+        """Потоковый ответ учитывает SQL, шаблоны и размер до конца
+        отдачи, как и обычный."""
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {index}', author=author) for index in range(3)
+        )
+        results = {}
+        for streaming in (False, True):
+            cache.clear()
+            metrics.reset()
+            with self.settings(STREAMING_PAGES=streaming):
+                response = self.client.get(reverse('posts:index'))
+                self.assertEqual(response.streaming, streaming)
+                body = (b''.join(response.streaming_content) if streaming
+                        else response.content)
+            results[streaming] = metrics.summary()['posts:index']
+            self.assertEqual(results[streaming]['requests'], 1)
+            self.assertEqual(results[streaming]['size_avg'], len(body))
+            self.assertGreater(results[streaming]['template_ms_avg'], 0)
+        self.assertEqual(
+            results[True]['queries_max'], results[False]['queries_max'])
+
+
+class DuplicateQueryTests(TestCase):
+    def test_fingerprint_ignores_values(self):
+        """Отпечаток не зависит от параметров и длины списка IN."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 21'),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s)\nLIMIT 10"),
+        )
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE name = 'x' AND U0.id = 5"),
+            'SELECT * FROM t WHERE name = ? AND U0.id = ?',
+        )
+
+    @override_settings(DUPLICATE_QUERY_THRESHOLD=0)
+    def test_middleware_warns_about_duplicates(self):
+        """Middleware предупреждает о запросах сверх порога."""
+        cache.clear()
+        with self.assertWarns(DuplicateQueryWarning):
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(DUPLICATE_QUERY_THRESHOLD=0, STREAMING_PAGES=True)
+    def test_middleware_sees_streamed_queries(self):
+        """Запросы потоковой части проверяются, когда поток отдан."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        with self.assertWarns(DuplicateQueryWarning):
+            b''.join(response.streaming_content)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_staff_header_writes_profiles(self):
+        """Запрос сотрудника с X-Profile сохраняет cProfile и стеки."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        with self.settings(PROFILE_DIR=self.directory):
+            response = self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE='1'
+            )
+        name = response['X-Profile']
+        self.assertIn('posts.index', name)
+        files = sorted(os.listdir(self.directory))
+        self.assertEqual(
+            [os.path.splitext(file)[1] for file in files],
+            ['.collapsed', '.prof'],
+        )
+
+    def test_header_ignored_for_other_users(self):
+        with self.settings(PROFILE_DIR=self.directory):
+            response = self.client.get(
+                reverse('posts:index'), HTTP_X_PROFILE='1'
+            )
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_slow_request_writes_collapsed_stacks(self):
+        """Запрос дольше порога сохраняется в формате collapsed."""
+        with self.settings(PROFILE_DIR=self.directory,
+                           PROFILE_SLOW_REQUEST_MS=0,
+                           PROFILE_SAMPLE_INTERVAL=0.001):
+            self.client.get(reverse('posts:index'))
+        files = os.listdir(self.directory)
+        self.assertEqual(len(files), 1)
+        self.assertIn('posts.index', files[0])
+        self.assertTrue(files[0].endswith('.collapsed'))
+
+    def test_streamed_request_profiled_until_closed(self):
+        """Профиль потокового ответа пишется после отдачи всех частей."""
+        with self.settings(PROFILE_DIR=self.directory,
+                           PROFILE_SLOW_REQUEST_MS=0,
+                           STREAMING_PAGES=True):
+            response = self.client.get(reverse('posts:index'))
+            self.assertEqual(os.listdir(self.directory), [])
+            b''.join(response.streaming_content)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP недоступен')
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('SMTP не отвечает')
+
+    def send_messages(self, email_messages):
+        raise AssertionError('соединение не открыто')
+
+
+class StopLoop(Exception):
+    pass
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.QueuedEmailBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class OutboxTests(TestCase):
+    def test_contact_form_is_queued(self):
+        """Форма обратной связи ставит письмо в очередь, команда
+        его отправляет."""
+        user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        self.client.force_login(user)
+        response = self.client.post(reverse('posts:contact'), {
+            'subject': 'Тема', 'message': 'Текст письма',
+        })
+        self.assertRedirects(response, reverse('posts:success'))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+        call_command('send_queued_mail', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Тема')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_password_reset_is_queued(self):
+        User.objects.create_user(
+            username='reader', email='r@example.com', password='pass')
+        self.client.post(
+            reverse('users:password_reset_form'), {'email': 'r@example.com'})
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        self.assertEqual(send_queued(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['r@example.com'])
+
+    @override_settings(
+        OUTBOX_EMAIL_BACKEND='posts.tests.tests_core.FailingEmailBackend')
+    def test_retry_with_backoff(self):
+        """Неудачная отправка откладывается всё дальше, после
+        MAX_ATTEMPTS попыток письмо остаётся в очереди."""
+        mail.send_mail('Тема', 'Текст', 'from@example.com', ['to@x.com'])
+        delays = []
+        for _ in range(MAX_ATTEMPTS):
+            OutboxMessage.objects.update(next_attempt=timezone.now())
+            started = timezone.now()
+            self.assertEqual(send_queued(), (0, 1))
+            item = OutboxMessage.objects.get()
+            delays.append(item.next_attempt - started)
+        self.assertEqual(item.attempts, MAX_ATTEMPTS)
+        self.assertIn('SMTP недоступен', item.last_error)
+        self.assertEqual(delays, sorted(delays))
+        self.assertLess(delays[0], delays[1])
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(send_queued(), (0, 0))
+
+    @override_settings(
+        OUTBOX_EMAIL_BACKEND='posts.tests.tests_core.UnreachableEmailBackend')
+    def test_open_failure_postpones_batch(self):
+        """Ошибка соединения - неудачная попытка для всей пачки."""
+        for index in range(3):
+            mail.send_mail(
+                f'Тема {index}', 'Текст', 'from@example.com', ['to@x.com'])
+        started = timezone.now()
+        self.assertEqual(send_queued(), (0, 3))
+        for item in OutboxMessage.objects.all():
+            self.assertEqual(item.attempts, 1)
+            self.assertIn('SMTP не отвечает', item.last_error)
+            self.assertGreaterEqual(
+                item.next_attempt, started + retry_delay(1))
+            self.assertLess(item.next_attempt, started + LEASE)
+
+    def test_loop_logs_errors(self):
+        """В режиме --loop сбой пачки пишется в лог, воркер ждёт
+        и продолжает."""
+        command = 'core.management.commands.send_queued_mail'
+        with mock.patch(f'{command}.send_queued',
+                        side_effect=DatabaseError('база занята')), \
+                mock.patch(f'{command}.time.sleep',
+                           side_effect=[None, StopLoop]) as sleep, \
+                self.assertLogs(command, 'ERROR') as logs, \
+                self.assertRaises(StopLoop):
+            call_command('send_queued_mail', '--loop', stdout=StringIO())
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('база занята', logs.output[0])
+
+
+@override_settings(TEMPLATES=[{
+    'BACKEND': 'core.template_backends.TimedDjangoTemplates',
+    'DIRS': [settings.TEMPLATES_DIR],
+    'OPTIONS': {'loaders': [
+        ('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS),
+    ]},
+}])
+class WarmUpTests(TestCase):
+    def test_templates_compiled_into_cache(self):
+        """После прогрева шаблоны страниц берутся из cached.Loader."""
+        compiled, errors = compile_templates()
+        self.assertEqual(errors, [])
+        loader = engines.all()[0].engine.template_loaders[0]
+        for name in ('posts/index.html', 'base.html',
+                     'includes/header.html', 'includes/paginator.html'):
+            with self.subTest(name=name):
+                self.assertIn(name, loader.get_template_cache)
+        self.assertGreaterEqual(compiled, len(loader.get_template_cache))
+
+    def test_command_requests_pages(self):
+        out = StringIO()
+        call_command('warm_up', stdout=out)
+        self.assertIn('posts:index: 200', out.getvalue())
+
+    def test_start_warm_up_logs_failure(self):
+        """Сбой прогрева при загрузке wsgi пишется в лог, а не падает."""
+        with self.settings(WARM_UP_ON_START=True, WARM_UP_URLS=None), \
+                self.assertLogs('core.warmup', 'ERROR') as logs:
+            warm_up_on_start()
+        self.assertIn('Не удалось прогреть воркер', logs.output[0])
+
+
+class StaticAssetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.settings = override_settings(
+            DEBUG=False,
+            STATIC_ROOT=cls.root,
+            STATICFILES_STORAGE=(
+                'core.storage.CompressedManifestStaticFilesStorage'),
+        )
+        cls.settings.enable()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def collected(self):
+        return [
+            os.path.relpath(os.path.join(directory, name), self.root)
+            for directory, _, names in os.walk(self.root)
+            for name in names
+        ]
+
+    def test_collectstatic_hashes_and_compresses(self):
+        """Сборка пишет файлы с хешем и .gz-копии, без карт исходников
+        и bootstrap-grid."""
+        files = self.collected()
+        self.assertFalse([name for name in files if name.endswith('.map')])
+        self.assertFalse([name for name in files if 'bootstrap-grid' in name])
+        hashed = staticfiles_storage.stored_name('css/bootstrap.min.css')
+        self.assertRegex(hashed, r'^css/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, hashed), 'rb') as file:
+            original = file.read()
+        with gzip.open(os.path.join(self.root, hashed + '.gz')) as file:
+            self.assertEqual(file.read(), original)
+        # Картинки уже сжаты.
+        self.assertNotIn('img/logo.png.gz', files)
+
+    def test_middleware_serves_immutable_compressed(self):
+        middleware = StaticAssetsMiddleware(lambda request: HttpResponse())
+        hashed = staticfiles_storage.url('css/bootstrap.min.css')
+        response = middleware(RequestFactory().get(
+            hashed, HTTP_ACCEPT_ENCODING='gzip, deflate'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response.close()
+
+        plain = middleware(
+            RequestFactory().get('/static/css/bootstrap.min.css'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', plain['Cache-Control'])
+        plain.close()
+        missing = middleware(RequestFactory().get('/static/missing.css'))
+        self.assertEqual(missing.content, b'')
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Текст ' * 200)
+
+    def compress(self, response, **headers):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='gzip', **headers))
+
+    def test_page_is_gzipped(self):
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn(b'<article>', gzip.decompress(response.content))
+        plain = self.client.get(reverse('posts:index'))
+        self.assertFalse(plain.has_header('Content-Encoding'))
+
+    def test_streaming_compressed_by_chunks(self):
+        chunks = [b'<p>%d</p>' % number * 100 for number in range(5)]
+        response = self.compress(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        parts = list(response.streaming_content)
+        # Каждая часть сбрасывается сразу, а не копится до конца.
+        self.assertGreaterEqual(len(parts), len(chunks))
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+    def test_skips_small_media_and_encoded(self):
+        small = self.compress(HttpResponse('<p>коротко</p>'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        image = self.compress(
+            HttpResponse(b'x' * 4096, content_type='image/jpeg'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+        encoded = HttpResponse(b'x' * 4096)
+        encoded['Content-Encoding'] = 'br'
+        self.assertEqual(self.compress(encoded).content, b'x' * 4096)
+
+    def test_csrf_page_gets_random_padding(self):
+        """Страница с CSRF-токеном: только gzip и случайное имя файла
+        в заголовке (флаг FNAME)."""
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response.content[3] & 0x08)
+        self.assertIn(b'csrfmiddlewaretoken',
+                      gzip.decompress(response.content))
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        self.wrapper = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': self.path,
+            **settings.SQLITE_PRODUCTION,
+        })
+
+    def tearDown(self):
+        self.wrapper.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_pragmas_on_new_connection(self):
+        with self.wrapper.cursor() as cursor:
+            for name, expected in (
+                ('journal_mode', 'wal'), ('synchronous', 1),
+                ('busy_timeout', 5000), ('temp_store', 2),
+                ('cache_size', -16 * 1024), ('foreign_keys', 1),
+            ):
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(cursor.fetchone()[0], expected, name)
+
+    def test_transaction_takes_write_lock(self):
+        """BEGIN IMMEDIATE: блокировка записи берётся до первой записи."""
+        self.wrapper.ensure_connection()
+        self.wrapper._start_transaction_under_autocommit()
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        try:
+            with self.assertRaisesMessage(
+                    sqlite3.OperationalError, 'locked'):
+                other.execute('BEGIN IMMEDIATE')
+            # Читать WAL не мешает.
+            other.execute('SELECT 1').fetchone()
+        finally:
+            other.close()
+            self.wrapper.connection.execute('ROLLBACK')
@@ -0,0 +1,98 @@
+"""Предварительная генерация миниатюр картинок постов.
+
+Миниатюры всех размеров из settings.POST_THUMBNAIL_SIZES создаются
+пулом фоновых потоков сразу после загрузки картинки, чтобы первый
+показ поста в ленте не тратил время на декодирование и ресайз.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def thumbnail(image, size):
+    """Миниатюра картинки именованного размера или None."""
+    if not image:
+        return None
+    geometry, options = settings.POST_THUMBNAIL_SIZES[size]
+    try:
+        return get_thumbnail(image, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', image)
+        return None
+
+
+def thumbnail_file(image, size):
+    """ImageFile миниатюры без обращения к хранилищу.
+
+    Повторяет разбор опций ThumbnailBackend.get_thumbnail, чтобы
+    получить то же имя файла, а значит и ключ в KV-хранилище.
+    """
+    backend = default.backend
+    geometry, options = settings.POST_THUMBNAIL_SIZES[size]
+    options = dict(options)
+    source = ImageFile(image)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def prefetch_thumbnails(images, size='feed'):
+    """Загружает метаданные миниатюр страницы одним запросом."""
+    prefetch = getattr(default.kvstore, 'prefetch', None)
+    if prefetch is None:
+        return
+    prefetch([thumbnail_file(image, size) for image in images if image])
+
+
+def generate_thumbnails(image_name):
+    """Создаёт миниатюры всех размеров для картинки из хранилища."""
+    for size in settings.POST_THUMBNAIL_SIZES:
+        thumbnail(image_name, size)
+
+
+def _generate_in_worker(image_name):
+    try:
+        generate_thumbnails(image_name)
+    finally:
+        # Поток пула открывает собственное соединение с базой.
+        connection.close()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def schedule_thumbnails(post):
+    """Ставит генерацию миниатюр поста в очередь после коммита."""
+    if not post.image:
+        return
+    image_name = post.image.name
+    if not settings.POST_THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate_thumbnails(image_name))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(_generate_in_worker, image_name)
+    )
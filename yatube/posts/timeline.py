@@ -0,0 +1,124 @@
+"""Материализованная лента подписок (fan-out on write).
+
+При публикации пост раскладывается в ленты подписчиков автора.
+Посты очень плодовитых авторов не раскладываются: они подмешиваются
+в ленту при чтении (pull), чтобы одна публикация не порождала
+тысячи записей.
+"""
+from django.db import connection
+from django.db.models import Q
+
+from core.paginator import decode_cursor, keyset
+
+from .models import Follow, Post, TimelineEntry, User, UserCounters
+
+PULL_AUTHOR_MIN_POSTS = 5000
+BACKFILL_SIZE = 500
+BATCH_SIZE = 500
+
+FAN_OUT_SQL = '''
+INSERT INTO {timeline} (user_id, post_id, author_id, pub_date)
+SELECT follow.user_id, post.id, post.author_id, post.pub_date
+FROM {follow} AS follow
+JOIN {post} AS post ON post.author_id = follow.author_id
+WHERE follow.author_id = %s AND post.id IN ({placeholders})
+'''
+
+
+def pull_authors():
+    """Авторы, чьи посты подмешиваются в ленту при чтении: плодовитые
+    и те, чьи посты когда-то не раскладывались (иначе эти посты
+    пропали бы из лент, когда постов станет меньше порога)."""
+    return User.objects.filter(
+        Q(counters__posts__gte=PULL_AUTHOR_MIN_POSTS)
+        | Q(counters__pulled=True)
+    )
+
+
+def is_pull_author(author_id):
+    return pull_authors().filter(pk=author_id).exists()
+
+
+def fan_out(post):
+    """Раскладывает новый пост в ленты подписчиков автора."""
+    fan_out_posts(post.author_id, [post])
+
+
+def fan_out_posts(author_id, posts):
+    """Раскладывает новые посты одного автора в ленты подписчиков
+    одним INSERT ... SELECT, не загружая подписчиков в Python."""
+    if not posts:
+        return
+    if is_pull_author(author_id):
+        UserCounters.objects.filter(
+            user_id=author_id, pulled=False).update(pulled=True)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(FAN_OUT_SQL.format(
+            timeline=TimelineEntry._meta.db_table,
+            follow=Follow._meta.db_table,
+            post=Post._meta.db_table,
+            placeholders=', '.join(['%s'] * len(posts)),
+        ), [author_id, *(post.pk for post in posts)])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_pull_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:BACKFILL_SIZE]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id,
+                          author_id=author_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_feed(user, after=None, before=None, limit=None):
+    """Посты ленты подписок: материализованные и подмешанные.
+
+    С limit отбирает кандидатов страницы после курсора after (или
+    до before): не больше limit записей ленты по индексу
+    (user, pub_date, post) и столько же постов каждого подмешанного
+    автора по индексу (author, pub_date). Слияние этих списков даёт
+    не больше limit первых постов страницы, поэтому CursorPaginator
+    с тем же курсором и per_page < limit получает верную страницу,
+    не проходя по всей таблице постов. Без limit (точные номера
+    страниц) возвращает всю ленту.
+
+    Записи ленты подмешанных авторов (оставшиеся с тех пор, как автор
+    был ниже порога) не учитываются: их посты и так берутся из Post.
+    """
+    pulled = list(pull_authors().filter(
+        following__user=user).values_list('pk', flat=True))
+    entries = TimelineEntry.objects.filter(user=user).exclude(
+        author_id__in=pulled)
+    if limit is None:
+        return Post.objects.filter(
+            Q(pk__in=entries.values('post')) | Q(author_id__in=pulled)
+        )
+    after = decode_cursor(after)
+    before = None if after else decode_cursor(before)
+    sources = [(entries, 'post_id')] + [
+        (Post.objects.filter(author_id=author_id), 'pk')
+        for author_id in pulled
+    ]
+    candidates = [
+        row
+        for queryset, pk in sources
+        for row in keyset(queryset, after, before, pk=pk).values_list(
+            'pub_date', pk)[:limit]
+    ]
+    candidates = sorted(set(candidates), reverse=before is None)[:limit]
+    return Post.objects.filter(pk__in=[pk for _, pk in candidates])
@@ -1,77 +1,145 @@
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.core.paginator import Paginator
 from django.http import HttpResponseRedirect
 from django.core.mail import send_mail, BadHeaderError
+from django.db import transaction
 from posts.forms import PostForm, ContactForm, CommentForm
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from .models import Post, Group, Follow
+from core.paginator import (
+    COMMENTS_PER_PAGE, POSTS_PER_PAGE, paginate, paginate_lazily,
+)
+from core.streaming import render_page
+from .cache import (
+    feed_cache_context, following_feed, group_feed, index_feed, profile_feed,
+)
+from .conditional import feed_validators, not_modified, set_validators
+from .models import Comment, Post, Group, Follow, UserCounters
+from .search import search_posts
+from .thumbnails import schedule_thumbnails
+from .timeline import follow_feed
 
 User = get_user_model()
 
 
 def index(request):
+    validators = feed_validators(request, index_feed())
+    response = not_modified(request, validators)
+    if response:
+        return response
     keyword = request.GET.get("search", None)
     if keyword:
-        post_list = Post.objects.filter(text__contains=keyword)
-        paginator = Paginator(post_list, 10)
+        post_list = search_posts(keyword, Post.objects.for_feed())
+        page_obj = paginate_lazily(request, post_list, exact=True)
     else:
-        post_list = Post.objects.all()
-        paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        post_list = Post.objects.for_feed()
+        page_obj = paginate_lazily(request, post_list)
     context = {
         'page_obj': page_obj,
         'keyword': keyword,
+        **feed_cache_context(index_feed()),
     }
-    return render(request, 'posts/index.html', context)
+    return set_validators(
+        render_page(request, 'posts/index.html', context), validators)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('group').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    validators = feed_validators(request, group_feed(group.pk))
+    response = not_modified(request, validators)
+    if response:
+        return response
+    post_list = group.posts.for_feed()
+    page_obj = paginate_lazily(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(group_feed(group.pk)),
     }
-    return render(request, 'posts/group_list.html', context)
+    return set_validators(
+        render_page(request, 'posts/group_list.html', context), validators)
 
 
 def post_detail(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    count = post.author.posts.select_related('author').all().count()
+    # Пост, его комментарии и число постов автора сбрасывают ленту
+    # профиля автора.
+    validators = feed_validators(request, profile_feed(post.author_id))
+    response = not_modified(request, validators)
+    if response:
+        return response
+    count = UserCounters.for_user(post.author).posts
     form_comment = CommentForm()
-    comments = post.comments.select_related('post').all()
+    comments = comments_page(request, post.pk)
     context = {
         'post': post,
         'count': count,
         'form_comment': form_comment,
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return set_validators(
+        render_page(request, 'posts/post_detail.html', context), validators)
 
 
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author').all()
-    count = post_list.count()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
     user = request.user
+    feeds = [profile_feed(author.pk)]
+    if user.is_authenticated:
+        feeds.append(following_feed(user.pk))
+    validators = feed_validators(request, *feeds)
+    response = not_modified(request, validators)
+    if response:
+        return response
+    post_list = author.posts.for_feed()
+    count = UserCounters.for_user(author).posts
+    page_obj = paginate_lazily(request, post_list)
+
     following = user.is_authenticated and author.following.exists()
     context = {
         'author': author,
         'count': count,
         'page_obj': page_obj,
         'following': following,
+        'is_author': author == user,
+        **feed_cache_context(profile_feed(author.pk)),
     }
-    return render(request, 'posts/profile.html', context)
+    return set_validators(
+        render_page(request, 'posts/profile.html', context), validators)
+
+
+def comments_page(request, post_id):
+    """Пачка комментариев поста от старых к новым, следующая (более
+    новая) пачка - по курсору ?after=... по (created, id)."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').order_by('created', 'pk')
+    return paginate(request, comments, COMMENTS_PER_PAGE, key='created',
+                    descending=False)
+
+
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для подгрузки на странице поста:
+    HTML-фрагмент или JSON (?format=json)."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    comments = comments_page(request, post_id)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            # В режиме ?page=N курсоров нет.
+            'next_cursor': getattr(comments, 'next_cursor', None),
+        })
+    return render(request, 'includes/comments.html', {
+        'comments': comments,
+        'post_id': post_id,
+    })
 
 
 @login_required
@@ -82,7 +150,11 @@ def post_create(request):
             try:
                 obj = form.save(commit=False)
                 obj.author = request.user
-                obj.save()
+                # Пост, счётчики, лента подписчиков и поисковый индекс
+                # (сигнал post_save) сохраняются вместе.
+                with transaction.atomic():
+                    obj.save()
+                schedule_thumbnails(obj)
                 return redirect('posts:profile', obj.author)
             except ValueError:
                 form.add_error(None, 'Ошибка добавления поста')
@@ -106,7 +178,10 @@ def post_edit(request, post_id):
         form = PostForm(request.POST, files=request.FILES, instance=post)
         if form.is_valid():
             try:
-                form.save()
+                with transaction.atomic():
+                    post = form.save()
+                if 'image' in form.changed_data:
+                    schedule_thumbnails(post)
                 return redirect('posts:post_detail', post_id)
             except ValueError:
                 form.add_error(None, 'Ошибка добавления поста')
@@ -165,7 +240,8 @@ def add_comment(request, post_id):
             comment = form.save(commit=False)
             comment.author = request.user
             comment.post = post
-            comment.save()
+            with transaction.atomic():
+                comment.save()
             return redirect('posts:post_detail', post_id=post_id)
     form = CommentForm()
     return render(
@@ -180,17 +256,17 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    user = request.user
-    authors = user.follower.values_list('author', flat=True)
-    post_list = Post.objects.filter(author__id__in=authors)
-
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # С ?page=N - точные номера страниц по всей ленте.
+    limit = None if 'page' in request.GET else POSTS_PER_PAGE + 1
+    post_list = follow_feed(
+        request.user, request.GET.get('after'), request.GET.get('before'),
+        limit,
+    ).for_feed()
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
     }
-    return render(request, 'posts/follow.html', context)
+    return render_page(request, 'posts/follow.html', context)
 
 
 @login_required
@@ -198,7 +274,8 @@ def profile_follow(request, username):
     author = User.objects.get(username=username)
     user = request.user
     if author != user:
-        Follow.objects.get_or_create(user=user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=user, author=author)
         return redirect(
             'posts:profile',
             username=username
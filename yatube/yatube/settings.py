@@ -40,25 +40,30 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     'about',
     'core',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'core.apps.StaticFilesConfig',
     'users.apps.UsersConfig',
     'rest_framework',
+    'api',
     'sorl.thumbnail',
     'django_cleanup',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.StaticAssetsMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,12 +71,22 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Скомпилированные шаблоны хранятся в памяти процесса (cached.Loader).
+# В разработке выключено: правки шаблонов видны без перезапуска.
+CACHED_TEMPLATES = not DEBUG
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if CACHED_TEMPLATES else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -89,10 +104,30 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Профиль SQLite для продакшена (бэкенд core.sqlite): WAL, чтобы
+# запись не блокировала чтение, прагмы на каждом новом соединении,
+# BEGIN IMMEDIATE для atomic() и соединения, живущие между запросами.
+# Сравнение с настройками по умолчанию: manage.py benchmark --concurrency.
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+            # Отрицательное значение - размер в КиБ на соединение.
+            'cache_size': -16 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **({} if DEBUG else SQLITE_PRODUCTION),
     }
 }
 
@@ -129,9 +164,20 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'static_collected')
+# В продакшене collectstatic пишет файлы с хешем в имени и сжатые
+# копии, их отдаёт StaticAssetsMiddleware. В разработке статика
+# берётся из STATICFILES_DIRS как есть, без сборки.
+STATICFILES_STORAGE = (
+    'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+    else 'core.storage.CompressedManifestStaticFilesStorage'
+)
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма из запросов ставятся в очередь (core.mail), команда
+# send_queued_mail отправляет их через OUTBOX_EMAIL_BACKEND.
+EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
@@ -141,6 +187,49 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
+# Тесты работают с кэшем во временном каталоге, а не в BASE_DIR/cache.
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
+
+# Именованные размеры миниатюр постов: (геометрия, опции sorl-thumbnail).
+# Используются тегом post_thumbnail и фоновой генерацией при загрузке.
+POST_THUMBNAIL_SIZES = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Потоков фоновой генерации миниатюр; 0 - генерировать в запросе.
+# В режиме разработки миниатюры создаются сразу, чтобы тесты
+# не гонялись с фоновыми потоками за временной MEDIA_ROOT.
+POST_THUMBNAIL_WORKERS = 0 if DEBUG else 2
+
+# Порог поиска N+1: при DEBUG запрос, выполненный за один HTTP-запрос
+# больше этого числа раз, выдаётся как DuplicateQueryWarning.
+DUPLICATE_QUERY_THRESHOLD = 3 if DEBUG else None
+
+# Профилирование: запросы дольше PROFILE_SLOW_REQUEST_MS (None - не
+# отслеживать) и запросы персонала с заголовком X-Profile сохраняются
+# в PROFILE_DIR. Сэмплер снимает стеки раз в PROFILE_SAMPLE_INTERVAL с.
+PROFILE_SLOW_REQUEST_MS = None
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+# Страницы постов и ленты отдаются потоком (core.streaming): <head>
+# и шапка уходят клиенту до того, как отрисованы списки. В разработке
+# выключено, чтобы ошибки шаблонов показывались отладочной страницей.
+STREAMING_PAGES = not DEBUG
+
+# Прогрев воркера при загрузке yatube/wsgi.py (ошибки пишутся в лог)
+# и командой warm_up: компиляция шаблонов и первые запросы
+# к страницам WARM_UP_URLS.
+WARM_UP_ON_START = not DEBUG
+WARM_UP_URLS = ['posts:index']
+
+# Метаданные миниатюр: таблица в базе и LRU-кэш процесса.
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
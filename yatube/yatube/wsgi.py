@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Воркер прогревается до первого запроса (см. core.warmup).
+from core.warmup import warm_up_on_start  # noqa: E402
+
+warm_up_on_start()